@@ -6,11 +6,13 @@ from app.middleware.AuthMiddleware import auth_middleware
 from pydantic import BaseModel, EmailStr
 
 from app.core.security import (
-    get_password_hash,
-    verify_password,
+    hash_password,
+    check_password,
     create_token,
-    verify_token,
+    authenticate,
+    revoke_token,
 )
+from cachetools import TTLCache
 from app.core.settings import settings
 from app.db.session import SessionLocal
 from app.db import models
@@ -18,6 +20,9 @@ from app.utils.apiResponse import ApiResponse
 
 router = APIRouter()
 
+# user_id -> {"id", "email"} for /authStatus, dropped on logout
+user_cache = TTLCache(maxsize=settings.AUTH_TOKEN_CACHE_SIZE, ttl=settings.AUTH_USER_CACHE_TTL_SECONDS)
+
 class UserRegister(BaseModel):
     email: EmailStr
     password: str
@@ -41,7 +46,7 @@ async def register(payload: UserRegister):
         user = models.User(
             id=uuid4(),
             email=payload.email,
-            password=get_password_hash(payload.password)
+            password=await hash_password(payload.password)
         )
         db.add(user)
         await db.commit()
@@ -56,7 +61,8 @@ async def login(response: Response, payload: UserLogin):
         )
         user = result.scalar_one_or_none()
 
-        if not user or not verify_password(payload.password, user.password):
+        valid = await check_password(payload.password, user.password if user else None)
+        if not valid:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid credentials"
@@ -89,7 +95,7 @@ async def login(response: Response, payload: UserLogin):
 @router.post("/refresh")
 async def refresh_token(request: Request, response: Response):
     token = request.cookies.get("refresh_token")
-    payload = verify_token(token)
+    payload = await authenticate(token)
     if not payload:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -111,8 +117,10 @@ async def refresh_token(request: Request, response: Response):
     ).to_dict()
 
 @router.get("/logout", dependencies=[Depends(auth_middleware)])
-async def logout(response: Response):
-    print("hi i am here ")
+async def logout(request: Request, response: Response):
+    await revoke_token(request.cookies.get("access_token"))
+    await revoke_token(request.cookies.get("refresh_token"))
+    user_cache.pop(str(request.state.user_id), None)
     response.delete_cookie("access_token")
     response.delete_cookie("refresh_token")
     return ApiResponse(
@@ -122,27 +130,27 @@ async def logout(response: Response):
 
 @router.get("/authStatus",dependencies=[Depends(auth_middleware)])
 async def checkAuthStatus(request:Request,response:Response):
-    async with SessionLocal() as db:
-        result = await db.execute(
-            select(models.User).where(models.User.id == request.state.user_id)
-        )
-        user = result.scalar_one_or_none()
-        
-        if not user:
+    user = user_cache.get(str(request.state.user_id))
+    if user is None:
+        async with SessionLocal() as db:
+            result = await db.execute(
+                select(models.User.id, models.User.email).where(models.User.id == request.state.user_id)
+            )
+            row = result.first()
+
+        if not row:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User not found"
             )
-        
-        return ApiResponse(
-            200,
-            "User authenticated successfully",
-            {
-                "authenticated": True,
-                "user": {
-                    "id": str(user.id),
-                    "email": user.email
-                }
-            }
-        )
+        user = {"id": str(row.id), "email": row.email}
+        user_cache[user["id"]] = user
 
+    return ApiResponse(
+        200,
+        "User authenticated successfully",
+        {
+            "authenticated": True,
+            "user": user
+        }
+    )
@@ -1,74 +1,127 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, status
-from app.services.fetch_docs import relevent_chunks
+from app.services.fetch_docs import relevent_chunks, build_context
+from app.services.vector_store import get_embedder
+from app.services.answer_cache import answer_cache
 from app.db.session import SessionLocal
-from app.db.models import ChatMessage, ChatSession
+from app.db.models import ChatSession
 from app.core.settings import settings
+from app.core.metrics import chat_stage_seconds
 from datetime import datetime
 from sqlalchemy import select
 from uuid import uuid4, UUID
-from typing import Dict
-from app.core.security import verify_token
-from app.services.llm_bot import client, system_prompt
+from app.core.security import authenticate
+from app.services.llm_bot import stream_completion, system_prompt
+from app.services.conversation_memory import ConversationMemory
+from app.services.rate_limiter import rate_limiter
+from app.services.session_store import session_history
+from app.services.message_sink import message_sink
+from app.services.connection_manager import connection_manager, Connection, ConnectionRejected
+from contextlib import aclosing
 import asyncio
+import json
+import logging
+import math
+import time
 
 router = APIRouter()
-active_connections: Dict[str, WebSocket] = {}
-
-requests_times = []
-RATE_LIMIT = settings.RATE_LIMIT
-TIME_WINDOW = settings.TIME_WINDOW_SECONDS
-
-def can_send():
-    now = datetime.now()
-    
-    req_count_in_window = [t for t in requests_times if (now-t).total_seconds() < TIME_WINDOW]
-    
-    if len(req_count_in_window) >= RATE_LIMIT:
-        return False
-    
-    requests_times.append(now)
-    return True
+logger = logging.getLogger(__name__)
+
+
+async def stream_answer(connection: Connection, messages: list[dict]) -> str:
+    parts = []
+    started = time.perf_counter()
+    async with aclosing(stream_completion(messages)) as stream:
+        async for piece in stream:
+            if not parts:
+                chat_stage_seconds.observe(time.perf_counter() - started, "ttft")
+            parts.append(piece)
+            # Waits while the client's send queue is full, which throttles the LLM stream
+            await connection.send(piece)
+    chat_stage_seconds.observe(time.perf_counter() - started, "stream")
+    return "".join(parts)
+
+
+async def replay_answer(connection: Connection, answer: str):
+    # Same framing as a live answer, clients can't tell the two apart
+    step = settings.LLM_COALESCE_CHARS
+    for start in range(0, len(answer), step):
+        await connection.send(answer[start:start + step])
+
+
+async def watch_socket(connection: Connection, pending: list):
+    """
+    Wait for the next frame while an answer is streaming. A disconnect ends
+    the watch; any other frame is kept in `pending` for the chat loop.
+    """
+    try:
+        pending.append(await connection.receive())
+    except WebSocketDisconnect:
+        return True
+    return False
 
-def is_with_in_time_limits(timestamp):
-    return (datetime.now() - timestamp).total_seconds() < TIME_WINDOW
 
-async def cleanup_request_times():
-    global requests_times
-    while True:
-        await asyncio.sleep(5)
-        requests_times = list(filter(is_with_in_time_limits,requests_times))
+async def stream_until_disconnect(connection: Connection, messages: list[dict], pending: list) -> str:
+    stream_task = asyncio.create_task(stream_answer(connection, messages))
+    watch_task = asyncio.create_task(watch_socket(connection, pending))
+    try:
+        await asyncio.wait({stream_task, watch_task}, return_when=asyncio.FIRST_COMPLETED)
+        if watch_task.done() and watch_task.result():
+            # Client went away, stop generating instead of streaming into the void
+            stream_task.cancel()
+            raise WebSocketDisconnect()
+        return await stream_task
+    finally:
+        for task in (stream_task, watch_task):
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(stream_task, watch_task, return_exceptions=True)
     
 
 
 @router.websocket("/ws/chat/{pdf_id}")
 async def chat_ws(websocket: WebSocket, pdf_id: str):
     await websocket.accept()
-    print("🔌WebSocket connected")
 
     token = websocket.cookies.get('access_token')
     if not token:
-        print("No token in cookies → closing")
+        logger.info("Closing socket without token")
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return
 
-    token_data = verify_token(token)
+    token_data = await authenticate(token)
     user_id = token_data.get("sub") if token_data else None
     if not user_id:
-        print("Invalid token → closing")
+        logger.info("Closing socket with invalid token")
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return
 
     try:
-        init_payload = await websocket.receive_json()
-        print("Received init payload:", init_payload)
+        connection = connection_manager.admit(websocket, str(user_id))
+    except ConnectionRejected as e:
+        logger.warning("Socket rejected", extra={"user_id": user_id, "reason": e.reason})
+        await websocket.close(code=e.code, reason=e.reason)
+        return
+
+    try:
+        await serve_chat(connection, pdf_id, user_id)
+    finally:
+        # Runs on every exit path, so no socket stays registered
+        await connection_manager.release(connection)
+
+
+async def serve_chat(connection: Connection, pdf_id: str, user_id: str):
+    try:
+        init_payload = json.loads(await connection.receive())
     except Exception as e:
-        print("Error while receiving init payload:", e)
-        await websocket.close(code=status.WS_1003_UNSUPPORTED_DATA)
+        logger.info("Invalid init payload", extra={"user_id": user_id, "error": str(e)})
+        await connection.close(status.WS_1003_UNSUPPORTED_DATA)
         return
 
     session_id = init_payload.get("session_id")
     is_legal_doc = init_payload.get("is_legal_doc")
-    active_connections[session_id] = websocket
+    # Opt-in, older clients would render the quota and ping frames as chat text
+    report_quota = bool(init_payload.get("report_quota"))
+    connection.heartbeat = bool(init_payload.get("heartbeat"))
 
     async with SessionLocal() as db:
         session_uuid = UUID(session_id)
@@ -76,6 +129,7 @@ async def chat_ws(websocket: WebSocket, pdf_id: str):
             select(ChatSession).where(ChatSession.id == session_uuid)
         )
         chat_session = result.scalars().first()
+        is_resumed = chat_session is not None
         if not chat_session:
             chat_session = ChatSession(
                 id=session_uuid,
@@ -85,74 +139,108 @@ async def chat_ws(websocket: WebSocket, pdf_id: str):
             db.add(chat_session)
             await db.commit()
 
-    chat_history = [{ 'role': 'system', 'content': system_prompt }]
+    if is_resumed and str(chat_session.user_id) != str(user_id):
+        logger.warning("Session belongs to another user", extra={"user_id": user_id, "session_id": session_id})
+        await connection.close(status.WS_1008_POLICY_VIOLATION)
+        return
+
+    memory = ConversationMemory(system_prompt)
+    if is_resumed:
+        # Reconnect: pick the conversation up where it left off
+        for past_question, answer in await session_history.load(session_uuid):
+            memory.add_turn(past_question, answer)
+    else:
+        session_history.start(session_uuid)
+    pending = []
 
     try:
         while True:
-            data = await websocket.receive_json()
+            data = json.loads(pending.pop(0) if pending else await connection.receive())
             question = data.get("message")
             pdf_hash = data.get("pdf_hash")
 
             if not question or not pdf_hash:
-                await websocket.send_text("Missing question or PDF hash.")
+                await connection.send("Missing question or PDF hash.")
                 continue
-
-            # Fetch relevant document chunks
-            relevant_data = relevent_chunks(query=question, pdf_id=pdf_hash)
-            context = " ".join([doc['text'] for doc in relevant_data])
-
-            chat_history.append({
-                'role': 'user',
-                'content': f"{question}\n\nContext:\n{context}"
-            })
-            
-            if not can_send():
-                await websocket.send_text("As it is free tier,⚠️ Rate limit exceeded: Too many user requests, please wait a minute.")
-                await websocket.send_text("__END__")
-                continue
-            
-            
-            stream = client.chat.completions.create(
-                model="gemini-2.0-flash",
-                messages=chat_history,
-                stream=True
-            )
-
-            full_response = ""
-            for chunk in stream:
-                if chunk.choices and chunk.choices[0].delta.content:
-                    token = chunk.choices[0].delta.content
-                    full_response += token
-                    await websocket.send_text(token)
-
-            # Signal end of stream
-            await websocket.send_text("__END__")
-            chat_history.append({ 'role': 'assistant', 'content': full_response })
-
-            # Persist messages to database
-            async with SessionLocal() as db:
-                db.add_all([
-                    ChatMessage(
-                        id=uuid4(),
-                        session_id=session_id,
-                        role="user",
-                        content=question,
-                        created_at=datetime.now()
-                    ),
-                    ChatMessage(
-                        id=uuid4(),
-                        session_id=session_id,
-                        role="assistant",
-                        content=full_response,
-                        created_at=datetime.now()
-                    )
+            async with connection.turn():
+                asked_at = datetime.now()
+                turn_started = time.perf_counter()
+
+                # Only answers that don't depend on earlier turns can be shared.
+                # The query vector lands in the embedding cache, so retrieval
+                # below doesn't embed the question a second time.
+                cacheable = settings.ANSWER_CACHE_ENABLED and memory.is_empty
+                cached_answer = None
+                if cacheable:
+                    try:
+                        query_vector = await asyncio.wait_for(
+                            (await get_embedder()).aembed_query(question), settings.RETRIEVAL_TIMEOUT_SECONDS
+                        )
+                        cached_answer = answer_cache.get(pdf_hash, query_vector)
+                    except asyncio.TimeoutError:
+                        cacheable = False
+
+                if cached_answer is not None:
+                    # No LLM call, so it doesn't count against the rate limit
+                    await replay_answer(connection, cached_answer)
+                    await connection.send("__END__")
+                    full_response = cached_answer
+                else:
+                    # Fetch relevant document chunks
+                    try:
+                        relevant_data = await relevent_chunks(query=question, pdf_id=pdf_hash)
+                    except asyncio.TimeoutError:
+                        await connection.send("⚠️ Searching the document took too long, please try again.")
+                        await connection.send("__END__")
+                        continue
+                    context = build_context(relevant_data)
+
+                    quota = await rate_limiter.check(user_id)
+                    if not quota.allowed:
+                        await connection.send(f"As it is free tier,⚠️ Rate limit exceeded: Too many user requests, please wait {math.ceil(quota.reset_in)} seconds.")
+                        await connection.send("__END__")
+                        if report_quota:
+                            await connection.send("__QUOTA__" + json.dumps(quota.to_dict()))
+                        continue
+
+                    messages = memory.prompt(question, context)
+                    full_response = await stream_until_disconnect(connection, messages, pending)
+
+                    # Signal end of stream
+                    await connection.send("__END__")
+                    if report_quota:
+                        await connection.send("__QUOTA__" + json.dumps(quota.to_dict()))
+                    if cacheable and full_response:
+                        answer_cache.put(pdf_hash, question, query_vector, full_response)
+
+                memory.add_turn(question, full_response)
+
+                chat_stage_seconds.observe(time.perf_counter() - turn_started, "answer")
+
+                # Queued for the background flusher, off the response path
+                persist_started = time.perf_counter()
+                await message_sink.write([
+                    {
+                        "id": uuid4(),
+                        "session_id": session_uuid,
+                        "role": "user",
+                        "content": question,
+                        "created_at": asked_at,
+                    },
+                    {
+                        "id": uuid4(),
+                        "session_id": session_uuid,
+                        "role": "assistant",
+                        "content": full_response,
+                        "created_at": datetime.now(),
+                    },
                 ])
-                await db.commit()
+                chat_stage_seconds.observe(time.perf_counter() - persist_started, "persist")
+                session_history.append(session_uuid, question, full_response)
 
     except WebSocketDisconnect:
-        active_connections.pop(session_id, None)
-        print(f"Disconnected: {session_id}")
+        logger.info("Socket disconnected", extra={"session_id": session_id})
 
-    except Exception as e:
-        print(f"WebSocket error: {e}")
-        await websocket.close()
+    except Exception:
+        logger.exception("Chat socket failed", extra={"session_id": session_id})
+        await connection.close(status.WS_1011_INTERNAL_ERROR)
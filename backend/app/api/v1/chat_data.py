@@ -1,47 +1,145 @@
-from app.db.models import ChatMessage, ChatSession
-from fastapi import Response, Request, Depends, APIRouter
+from app.db.models import ChatMessage, ChatSession, PDFMeta
+from fastapi import Response, Request, Depends, APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from app.middleware.AuthMiddleware import auth_middleware
-from sqlalchemy import select, text
+from sqlalchemy import select, tuple_
 from app.db.session import SessionLocal
-from sqlalchemy.orm import selectinload
 from app.utils.apiResponse import ApiResponse
 from datetime import datetime, timedelta
+from uuid import UUID
+from pydantic import BaseModel
+import base64
+import json
 router = APIRouter()
 
+HISTORY_COLUMNS = (ChatMessage.id, ChatMessage.role, ChatMessage.content, ChatMessage.created_at)
+
+
+def encode_cursor(created_at: datetime, message_id: UUID) -> str:
+    raw = f"{created_at.isoformat()}|{message_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, message_id = raw.split("|")
+        return datetime.fromisoformat(created_at), UUID(message_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def message_to_dict(row):
+    return {
+        "id": str(row.id),
+        "role": row.role,
+        "content": row.content,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+    }
+
+
+def owned_history(session_id: UUID, user_id):
+    return (
+        select(*HISTORY_COLUMNS)
+        .join(ChatSession, ChatSession.id == ChatMessage.session_id)
+        .where(ChatMessage.session_id == session_id, ChatSession.user_id == user_id)
+    )
+
+
+class PdfSummary(BaseModel):
+    id: UUID
+    name: str | None
+    hash: str | None
+
+
+class ChatSessionSummary(BaseModel):
+    id: UUID
+    pdf_id: UUID | None
+    pdf: PdfSummary | None
+
 
 @router.get("/get_chat_session", dependencies=[Depends(auth_middleware)])
-async def getChats(request: Request, response: Response):
+async def getChats(request: Request, response: Response,
+                   after: UUID | None = None, limit: int = Query(100, ge=1, le=500)):
+    # Only the columns the client needs, in one query, no ORM objects
+    query = (
+        select(ChatSession.id, ChatSession.pdf_id, PDFMeta.name, PDFMeta.hash)
+        .outerjoin(PDFMeta, PDFMeta.id == ChatSession.pdf_id)
+        .where(ChatSession.user_id == request.state.user_id)
+        .order_by(ChatSession.id)
+        .limit(limit + 1)
+    )
+    if after:
+        query = query.where(ChatSession.id > after)
+
     async with SessionLocal() as db:
-        result = await db.execute(
-            select(ChatSession)
-            .options(selectinload(ChatSession.pdf))
-            .where(
-                ChatSession.user_id == request.state.user_id)
-        )
-        sessions = result.scalars().all()
+        result = await db.execute(query)
+        rows = result.all()
 
-    if not sessions:
-        return ApiResponse(404, 'No records found', data={})
-    return ApiResponse(200, 'Chat sessions fetched successfully!!', data={"chat_sessions": [session for session in sessions]})
+    if not rows and not after:
+        return ApiResponse(404, 'No records found', data={}).to_response()
+
+    has_more = len(rows) > limit
+    sessions = [
+        ChatSessionSummary(
+            id=row.id,
+            pdf_id=row.pdf_id,
+            pdf=PdfSummary(id=row.pdf_id, name=row.name, hash=row.hash) if row.pdf_id else None,
+        )
+        for row in rows[:limit]
+    ]
+    return ApiResponse(200, 'Chat sessions fetched successfully!!', data={
+        "chat_sessions": sessions,
+        "has_more": has_more,
+        "next_cursor": sessions[-1].id if has_more else None,
+    }).to_response()
 
 
 @router.get('/chat_history', dependencies=[Depends(auth_middleware)])
-async def get_history(request: Request, response: Response, session_id: str):
+async def get_history(request: Request, response: Response, session_id: UUID,
+                      before: str | None = None, limit: int = Query(50, ge=1, le=200)):
+    """
+    Newest `limit` messages older than the `before` cursor, oldest first.
+    Keyset pagination on (created_at, id) keeps every page an index range scan.
+    """
+    query = owned_history(session_id, request.state.user_id)
+    if before:
+        created_at, message_id = decode_cursor(before)
+        query = query.where(tuple_(ChatMessage.created_at, ChatMessage.id) < (created_at, message_id))
+    query = query.order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()).limit(limit + 1)
+
     async with SessionLocal() as db:
-        query = text("""
-    SELECT * FROM chat_messages 
-    WHERE session_id = :s_id 
-    ORDER BY created_at ASC 
-    LIMIT 100
-""")
-        result = await db.execute(query, {
-            "s_id": session_id,
-        })
-        messages = result.fetchall()
-
-    if not messages:
-        return ApiResponse(404, 'No chat message found for this session', data={}).to_dict()
+        result = await db.execute(query)
+        messages = result.all()
+
+    if not messages and not before:
+        return ApiResponse(404, 'No chat message found for this session', data={}).to_response()
+
+    has_more = len(messages) > limit
+    messages = list(reversed(messages[:limit]))
 
     return ApiResponse(200, 'Fetched chat history', {
-        "chat_history": [dict(row._mapping) for row in messages]
-    }).to_dict()
+        "chat_history": [message_to_dict(row) for row in messages],
+        "has_more": has_more,
+        "next_cursor": encode_cursor(messages[0].created_at, messages[0].id) if has_more else None,
+    }).to_response()
+
+
+@router.get('/chat_history/export', dependencies=[Depends(auth_middleware)])
+async def export_history(request: Request, session_id: UUID):
+    """Stream the whole session as NDJSON, oldest first, without loading it into memory."""
+    query = owned_history(session_id, request.state.user_id).order_by(
+        ChatMessage.created_at.asc(), ChatMessage.id.asc()
+    )
+
+    async def rows():
+        async with SessionLocal() as db:
+            result = await db.stream(query.execution_options(yield_per=500))
+            async for row in result:
+                yield json.dumps(message_to_dict(row)) + "\n"
+
+    return StreamingResponse(
+        rows(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="chat_{session_id}.ndjson"'},
+    )
@@ -1,45 +1,271 @@
 from fastapi import APIRouter, File, UploadFile, Form, HTTPException, Depends, Request
-from app.services.pdf_processor import process_pdf
-from app.services.vector_store import upsert_pdf_embeddings
-from app.db.models import PDFMeta
+from app.services.ingestion import pipeline, IngestionTask, IngestionQueueFull, update_job
+from app.services.documents import (
+    acquire_document, lock_document, release_document, finish_document, resolve_document_hash,
+    legacy_hash_needed,
+)
+from app.services.pdf_processor import splitter_version
+from app.db.models import PDFMeta, IngestionJob, ChatSession, ChatMessage
 from app.db.session import SessionLocal
-from app.utils.hashing import sha256_hash
-from uuid import uuid4
+from app.services.pdf_processor import spool_upload, remove_file
+from uuid import uuid4, UUID
+from datetime import datetime, timedelta
+from app.core.settings import settings
 from sqlalchemy.future import select
+from sqlalchemy import delete, or_, update
 from app.utils.apiResponse import ApiResponse
 from app.middleware.AuthMiddleware import auth_middleware
 
 router = APIRouter()
 
 
+def job_to_dict(job: IngestionJob):
+    return {
+        "id": str(job.id),
+        "pdf_id": str(job.pdf_id) if job.pdf_id else None,
+        "pdf_hash": job.pdf_hash,
+        "status": job.status,
+        "stage": job.stage,
+        "progress": job.progress,
+        "chunks_total": job.chunks_total,
+        "chunks_done": job.chunks_done,
+        "error": job.error,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+    }
+
+
+def ingestion_busy():
+    return HTTPException(
+        status_code=503,
+        detail="Too many PDFs are being processed, please try again shortly",
+        headers={"Retry-After": "10"},
+    )
+
+
 @router.post("/upload", dependencies=[Depends(auth_middleware)])
 async def upload_pdf(file: UploadFile = File(...), request: Request = None):
     user_id = request.state.user_id  # populated by your AuthMiddleware
 
-    content = await file.read()
+    path, content_hash, legacy_hash = await spool_upload(file, legacy_hash=legacy_hash_needed())
+
+    try:
+        job = None
+        async with SessionLocal() as db:
+            hash_ = await resolve_document_hash(db, content_hash, legacy_hash)
+            existing = await db.execute(
+                select(PDFMeta).where(PDFMeta.hash ==
+                                      hash_, PDFMeta.user_id == user_id)
+            )
+            pdf = existing.scalar_one_or_none()
+            is_new = pdf is None
+            if is_new:
+                document = await acquire_document(db, hash_, content_hash)
+                pdf = PDFMeta(id=uuid4(), user_id=user_id,
+                              name=file.filename, hash=hash_)
+                db.add(pdf)
+                await db.flush()
+            else:
+                document = await lock_document(db, hash_, content_hash)
+
+            if document.status != "ready":
+                job = await active_job(db, hash_)
+
+            # Embedded once per content hash, only start ingesting if nobody else is
+            start_ingestion = document.status != "ready" and job is None
+            if start_ingestion:
+                # Reject early instead of queueing unbounded work
+                if not pipeline.has_capacity():
+                    raise ingestion_busy()
+                document.status = "pending"
+                job = IngestionJob(id=uuid4(), pdf_id=pdf.id, user_id=user_id,
+                                   pdf_hash=hash_, status="queued", stage="queued", progress=0)
+                db.add(job)
+
+            await db.commit()
+
+        if start_ingestion:
+            # From here on the pipeline owns the spooled file
+            pipeline.submit(IngestionTask(job_id=job.id, pdf_hash=hash_, path=path))
+        else:
+            remove_file(path)
+    except IngestionQueueFull:
+        remove_file(path)
+        await update_job(job.id, status="failed", error="Ingestion queue is full")
+        await finish_document(hash_, "failed")
+        raise ingestion_busy()
+    except BaseException:
+        remove_file(path)
+        raise
+
+    if start_ingestion:
+        message = "PDF uploaded, processing started"
+    elif job:
+        message = "PDF is already being processed"
+    else:
+        message = "PDF uploaded" if is_new else "PDF already exists"
+
+    return ApiResponse(202 if job else 200, message, {
+        "pdf": pdf,
+        "job": job_to_dict(job) if job else None,
+    }).to_dict()
+
+
+async def active_job(db, pdf_hash: str, pdf_id: UUID | None = None) -> IngestionJob | None:
+    """
+    The queued or running job for the document, or for the PDF too when
+    pdf_id is given. Jobs live in one worker's memory and its heartbeat keeps
+    updated_at fresh; one that went quiet died with its worker, so it is
+    failed here instead of blocking the document for good.
+    """
+    target = IngestionJob.pdf_hash == pdf_hash
+    if pdf_id is not None:
+        target = or_(target, IngestionJob.pdf_id == pdf_id)
+    active = IngestionJob.status.in_(["queued", "running"])
+    cutoff = datetime.now() - timedelta(seconds=settings.INGEST_JOB_STALE_SECONDS)
+    await db.execute(
+        update(IngestionJob)
+        .where(target, active, IngestionJob.updated_at < cutoff)
+        .values(status="failed", error="Worker stopped before finishing", updated_at=datetime.now())
+    )
+    result = await db.execute(
+        select(IngestionJob)
+        .where(target, active)
+        .order_by(IngestionJob.created_at.desc())
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
+
+
+@router.put("/{pdf_id}", dependencies=[Depends(auth_middleware)])
+async def reupload_pdf(pdf_id: UUID, file: UploadFile = File(...), request: Request = None):
+    """
+    Re-ingest a PDF from a revised file, or from the same file after the
+    chunking settings changed. Only chunks whose content changed get embedded.
+    """
+    user_id = request.state.user_id
+    path, content_hash, legacy_hash = await spool_upload(file, legacy_hash=legacy_hash_needed())
+
     try:
-        decoded = content.decode("latin1")
-    except Exception:
-        raise HTTPException(
-            status_code=400, detail="Unable to decode PDF file")
+        job = None
+        async with SessionLocal() as db:
+            hash_ = await resolve_document_hash(db, content_hash, legacy_hash)
+            result = await db.execute(
+                select(PDFMeta).where(PDFMeta.id == pdf_id, PDFMeta.user_id == user_id)
+            )
+            pdf = result.scalar_one_or_none()
+            if not pdf:
+                raise HTTPException(status_code=404, detail="PDF not found")
+
+            old_hash = pdf.hash
+            is_revision = old_hash != hash_
+            if is_revision:
+                clash = await db.execute(
+                    select(PDFMeta.id).where(PDFMeta.user_id == user_id, PDFMeta.hash == hash_)
+                )
+                if clash.first():
+                    raise HTTPException(status_code=409, detail="You already have this version of the PDF")
+                document = await acquire_document(db, hash_, content_hash)
+            else:
+                document = await lock_document(db, hash_, content_hash)
+
+            # One revision at a time per PDF: two finishing would both try to switch it over
+            if await active_job(db, hash_, pdf_id=pdf.id):
+                raise HTTPException(status_code=409, detail="This PDF is already being processed")
+
+            up_to_date = document.status == "ready" and (
+                is_revision or document.splitter == splitter_version()
+            )
+            if up_to_date and is_revision:
+                # Someone already embedded this revision, just switch over to it
+                pdf.hash = hash_
+            elif not up_to_date:
+                if not pipeline.has_capacity():
+                    raise ingestion_busy()
+                if document.status != "ready":
+                    document.status = "pending"
+                job = IngestionJob(id=uuid4(), pdf_id=pdf.id, user_id=user_id,
+                                   pdf_hash=hash_, status="queued", stage="queued", progress=0)
+                db.add(job)
+
+            await db.commit()
+
+        if job:
+            pipeline.submit(IngestionTask(
+                job_id=job.id, pdf_hash=hash_, path=path,
+                pdf_id=pdf.id if is_revision else None,
+                base_hash=old_hash if is_revision else None,
+            ))
+        else:
+            remove_file(path)
+            if is_revision:
+                await release_document(old_hash)
+    except IngestionQueueFull:
+        remove_file(path)
+        await update_job(job.id, status="failed", error="Ingestion queue is full")
+        await finish_document(hash_, "failed")
+        if is_revision:
+            await release_document(hash_)
+        raise ingestion_busy()
+    except BaseException:
+        remove_file(path)
+        raise
+
+    if job:
+        message = "PDF revision is being processed" if is_revision else "PDF is being re-indexed"
+    else:
+        message = "Switched to the new PDF revision" if is_revision else "PDF is already up to date"
 
-    hash_ = sha256_hash(decoded)
+    return ApiResponse(202 if job else 200, message, {
+        "pdf": pdf,
+        "job": job_to_dict(job) if job else None,
+    }).to_dict()
 
+
+@router.get("/jobs/{job_id}", dependencies=[Depends(auth_middleware)])
+async def get_job_status(job_id: UUID, request: Request):
     async with SessionLocal() as db:
-        existing = await db.execute(
-            select(PDFMeta).where(PDFMeta.hash ==
-                                  hash_, PDFMeta.user_id == user_id)
+        user_id = request.state.user_id
+        # The uploader always may look, even while a revision job's hash isn't
+        # on their PDF yet; jobs belong to the shared document, so anyone
+        # holding it may look too
+        holds_document = (
+            select(PDFMeta.id)
+            .where(PDFMeta.hash == IngestionJob.pdf_hash, PDFMeta.user_id == user_id)
+            .exists()
+        )
+        result = await db.execute(
+            select(IngestionJob).where(
+                IngestionJob.id == job_id,
+                or_(IngestionJob.user_id == user_id, holds_document),
+            )
         )
-        existing_pdf = existing.scalar_one_or_none()
-        if existing_pdf:
-            return ApiResponse(200, "PDF already exists", {"pdf": existing_pdf}).to_dict()
+        job = result.scalars().first()
+
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return ApiResponse(200, "Job status fetched", {"job": job_to_dict(job)}).to_dict()
 
-        chunks = process_pdf(content)
-        upsert_pdf_embeddings(chunks, hash_)
 
-        pdf = PDFMeta(id=uuid4(), user_id=user_id,
-                      name=file.filename, hash=hash_)
-        db.add(pdf)
+@router.delete("/{pdf_id}", dependencies=[Depends(auth_middleware)])
+async def delete_pdf(pdf_id: UUID, request: Request):
+    async with SessionLocal() as db:
+        result = await db.execute(
+            select(PDFMeta).where(PDFMeta.id == pdf_id,
+                                  PDFMeta.user_id == request.state.user_id)
+        )
+        pdf = result.scalar_one_or_none()
+        if not pdf:
+            raise HTTPException(status_code=404, detail="PDF not found")
+
+        session_ids = select(ChatSession.id).where(ChatSession.pdf_id == pdf.id)
+        await db.execute(delete(ChatMessage).where(ChatMessage.session_id.in_(session_ids)))
+        await db.execute(delete(ChatSession).where(ChatSession.pdf_id == pdf.id))
+        # Jobs outlive the uploader's reference, they track the shared document
+        await db.execute(update(IngestionJob).where(IngestionJob.pdf_id == pdf.id).values(pdf_id=None))
+        await db.delete(pdf)
         await db.commit()
 
-        return ApiResponse(200, "PDF uploaded and embedded", {"pdf": pdf}).to_dict()
+    await release_document(pdf.hash)
+    return ApiResponse(200, "PDF deleted").to_dict()
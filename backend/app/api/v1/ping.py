@@ -0,0 +1,60 @@
+import asyncio
+from fastapi import APIRouter
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import text
+from app.core.services import services
+from app.db.session import engine
+from app.services.vector_store import get_qdrant, collection_name
+from app.services.message_sink import message_sink
+from app.services.answer_cache import answer_cache
+from app.services.connection_manager import connection_manager
+
+router = APIRouter()
+
+
+async def check_database():
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+async def check_qdrant():
+    name = await collection_name()
+    if not await (await get_qdrant()).collection_exists(name):
+        raise RuntimeError(f"collection {name} is missing")
+
+
+async def probe(check) -> str:
+    try:
+        await asyncio.wait_for(check(), timeout=2)
+        return "ok"
+    except Exception as e:
+        return f"error: {e}"
+
+
+@router.get("/live")
+async def live():
+    # The process is up and serving, dependencies are /ready's business
+    return {"status": "ok"}
+
+
+@router.get("/ready")
+async def ready():
+    if not services.ready:
+        return ORJSONResponse({"status": "starting"}, status_code=503)
+    database, qdrant = await asyncio.gather(probe(check_database), probe(check_qdrant))
+    is_ready = database == "ok" and qdrant == "ok"
+    return ORJSONResponse(
+        {"status": "ok" if is_ready else "unavailable", "database": database, "qdrant": qdrant},
+        status_code=200 if is_ready else 503,
+    )
+
+
+@router.get("/stats")
+async def stats():
+    embedder = services.peek("embedder")
+    return {
+        "embedding_cache": embedder.stats() if embedder else None,
+        "answer_cache": answer_cache.stats(),
+        "message_sink": message_sink.stats(),
+        "websockets": connection_manager.stats(),
+    }
@@ -0,0 +1,140 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Seconds, from cache hits to slow LLM streams
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _labels(names: tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.lock = threading.Lock()
+        registry.append(self)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, help, labelnames)
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        with self.lock:
+            values = list(self.values.items())
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, labels)} {value}" for labels, value in values
+        ]
+
+
+class Gauge(Metric):
+    """Set directly, or read from `function` at scrape time."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, help, labelnames)
+        self.values: dict[tuple, float] = {}
+        self.function = None
+
+    def set(self, value: float, *labels):
+        with self.lock:
+            self.values[labels] = value
+
+    def set_function(self, function):
+        self.function = function
+
+    def render(self) -> list[str]:
+        if self.function:
+            return self.header() + [f"{self.name} {self.function()}"]
+        with self.lock:
+            values = list(self.values.items())
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, labels)} {value}" for labels, value in values
+        ]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per bucket counts (+Inf last), sum, count]
+        self.values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self) -> list[str]:
+        with self.lock:
+            values = [(labels, list(counts), total, count) for labels, (counts, total, count) in self.values.items()]
+        lines = self.header()
+        names = self.labelnames + ("le",)
+        for labels, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_labels(names, labels + (bound,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+registry: list[Metric] = []
+
+
+def render() -> str:
+    """Every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+chat_stage_seconds = Histogram(
+    "chat_stage_seconds", "Time spent in each stage of a chat turn", ("stage",)
+)
+ingest_stage_seconds = Histogram(
+    "ingest_stage_seconds", "Time spent in each stage of a PDF ingestion", ("stage",),
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0),
+)
+ingest_jobs_total = Counter("ingest_jobs_total", "Finished ingestion jobs", ("status",))
+cache_requests_total = Counter("cache_requests_total", "Cache lookups by outcome", ("cache", "result"))
+rate_limit_total = Counter("rate_limit_total", "Rate limit checks by outcome", ("result",))
+websocket_connections = Gauge("websocket_connections", "Open chat sockets on this worker")
+websocket_rejected_total = Counter("websocket_rejected_total", "Chat sockets refused at admission", ("reason",))
@@ -0,0 +1,24 @@
+from app.core.settings import settings
+
+_client = None
+
+
+def get_redis():
+    """Shared Redis (or any Redis protocol server) client, None when REDIS_URL isn't set."""
+    global _client
+    if not settings.REDIS_URL:
+        return None
+    if _client is None:
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("REDIS_URL is set but the 'redis' package is not installed")
+        _client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _client
+
+
+async def close_redis():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
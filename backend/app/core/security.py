@@ -1,9 +1,16 @@
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
+from cachetools import TTLCache
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, status
 from app.core.settings import settings
+from app.core.redis import get_redis
+import asyncio
+import hashlib
+import time
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
@@ -11,6 +18,52 @@ def get_password_hash(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+
+# bcrypt burns 100ms+ of CPU per call, keep it off the event loop and cap how
+# many calls may wait for a thread so a login storm is shed instead of queued
+_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt"
+)
+_hash_slots = asyncio.Semaphore(settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_QUEUE)
+_dummy_hash: str | None = None
+
+
+async def _run_hashing(fn, *args):
+    if _hash_slots.locked():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many sign-in attempts right now, please retry shortly",
+            headers={"Retry-After": "2"},
+        )
+    async with _hash_slots:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_hash_executor, fn, *args)
+
+
+async def hash_password(password: str) -> str:
+    return await _run_hashing(get_password_hash, password)
+
+
+async def prepare_dummy_hash():
+    """Hash the unknown-user stand-in at startup, so the first such login isn't slower than the rest."""
+    global _dummy_hash
+    if _dummy_hash is None:
+        loop = asyncio.get_running_loop()
+        _dummy_hash = await loop.run_in_executor(_hash_executor, get_password_hash, "dummy-password")
+
+
+async def check_password(plain_password: str, hashed_password: str | None) -> bool:
+    """
+    Verify off the event loop. For unknown users pass hashed_password=None:
+    a dummy hash is still verified so the response time doesn't reveal
+    whether the email exists.
+    """
+    if hashed_password is None:
+        await prepare_dummy_hash()
+        await _run_hashing(verify_password, plain_password, _dummy_hash)
+        return False
+    return await _run_hashing(verify_password, plain_password, hashed_password)
+
 def create_token(data: dict, expires_delta: timedelta) -> str:
     to_encode = data.copy()
     expire = datetime.now() + expires_delta
@@ -23,3 +76,69 @@ def verify_token(token: str) -> dict | None:
         return payload
     except JWTError:
         return None
+
+
+# Verified claims by token id. Entries live at most AUTH_TOKEN_CACHE_TTL_SECONDS,
+# which also bounds how long a revocation on another worker goes unnoticed.
+_verified_tokens = TTLCache(
+    maxsize=settings.AUTH_TOKEN_CACHE_SIZE,
+    ttl=settings.AUTH_TOKEN_CACHE_TTL_SECONDS,
+)
+# Revoked token id -> expiry timestamp; entries are dropped once the token expires anyway
+_denylist: dict[str, float] = {}
+
+
+def token_id(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()[:32]
+
+
+def _purge_denylist():
+    now = time.time()
+    for key in [key for key, exp in _denylist.items() if exp <= now]:
+        del _denylist[key]
+
+
+async def revoke_token(token: str | None):
+    if not token:
+        return
+    key = token_id(token)
+    _verified_tokens.pop(key, None)
+    try:
+        claims = jwt.get_unverified_claims(token)
+        exp = float(claims.get("exp", 0))
+    except JWTError:
+        return
+    ttl = int(exp - time.time())
+    if ttl <= 0:
+        return
+    _purge_denylist()
+    _denylist[key] = exp
+    redis = get_redis()
+    if redis:
+        await redis.set(f"denylist:{key}", 1, ex=ttl)
+
+
+async def authenticate(token: str | None) -> dict | None:
+    """
+    verify_token with a cache of verified claims and a revocation check.
+    A cache hit is a couple of dictionary lookups instead of a JWT decode.
+    """
+    if not token:
+        return None
+    key = token_id(token)
+    if key in _denylist:
+        return None
+
+    claims = _verified_tokens.get(key)
+    if claims is not None and claims.get("exp", 0) > time.time():
+        return claims
+
+    redis = get_redis()
+    if redis and await redis.exists(f"denylist:{key}"):
+        _denylist[key] = time.time() + settings.AUTH_TOKEN_CACHE_TTL_SECONDS
+        return None
+
+    claims = verify_token(token)
+    if claims:
+        _verified_tokens[key] = claims
+    return claims
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceRegistry:
+    """
+    Process-wide clients, created on first use instead of at import so the
+    app can be imported without any backend reachable. The lifespan warms
+    them up concurrently in the background; tests can swap in stand-ins with
+    override(). Code on the event loop uses aget(), which awaits a build in
+    progress instead of blocking the loop on the thread lock get() takes.
+    """
+
+    def __init__(self):
+        self.factories = {}
+        self.closers = {}
+        self.instances = {}
+        self.locks: dict[str, threading.Lock] = {}
+        self.building: dict[str, asyncio.Future] = {}
+        self.ready = False
+        self.task: asyncio.Task | None = None
+
+    def register(self, name: str, factory, close=None):
+        self.factories[name] = factory
+        self.locks[name] = threading.Lock()
+        if close:
+            self.closers[name] = close
+
+    def get(self, name: str):
+        instance = self.instances.get(name)
+        if instance is None:
+            # Warm-up builds services on threads, make sure each is built once
+            with self.locks[name]:
+                instance = self.instances.get(name)
+                if instance is None:
+                    instance = self.factories[name]()
+                    self.instances[name] = instance
+        return instance
+
+    async def aget(self, name: str):
+        instance = self.instances.get(name)
+        if instance is not None:
+            return instance
+        building = self.building.get(name)
+        if building is None:
+            # Factories may block (model loads, version checks), build on a thread
+            building = asyncio.ensure_future(asyncio.to_thread(self.get, name))
+            self.building[name] = building
+            building.add_done_callback(lambda _: self.building.pop(name, None))
+        # Shielded so one cancelled caller doesn't abort the build for the others
+        return await asyncio.shield(building)
+
+    def peek(self, name: str):
+        """The instance if it was already created, without creating it."""
+        return self.instances.get(name)
+
+    def override(self, name: str, instance):
+        self.instances[name] = instance
+
+    def start(self, names: list[str], setup=()):
+        """Create `names` concurrently, then run the `setup` coroutines, retrying until both succeed."""
+        self.task = asyncio.create_task(self._start(names, setup))
+
+    async def _start(self, names: list[str], setup):
+        delay = 1.0
+        while True:
+            try:
+                await asyncio.gather(*(self.aget(name) for name in names))
+                for step in setup:
+                    await step()
+                self.ready = True
+                logger.info("Services warmed up", extra={"services": names})
+                return
+            except Exception as e:
+                logger.warning("Warm-up failed", extra={"retry_in": delay, "error": str(e)})
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+
+    async def close(self):
+        if self.task and not self.task.done():
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+        for name, close in self.closers.items():
+            instance = self.instances.pop(name, None)
+            if instance is not None:
+                await close(instance)
+        self.ready = False
+
+
+services = ServiceRegistry()
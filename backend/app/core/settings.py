@@ -2,15 +2,101 @@ from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     DATABASE_URL: str
+    DB_ECHO: bool = False
+    LOG_LEVEL: str = "INFO"
+    # "json" for one object per line, "text" for local development
+    LOG_FORMAT: str = "json"
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT_SECONDS: int = 30
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    # None detects PgBouncer / Supabase poolers from the URL
+    DB_BEHIND_POOLER: bool | None = None
     JWT_SECRET: str
     JWT_ALGO: str = "HS256"
     ACCESS_TOKEN_EXPIRE: int = 1
     REFRESH_TOKEN_EXPIRE: int = 2
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_QUEUE: int = 32
+    AUTH_TOKEN_CACHE_SIZE: int = 10000
+    AUTH_TOKEN_CACHE_TTL_SECONDS: int = 60
+    AUTH_USER_CACHE_TTL_SECONDS: int = 300
     QDRANT_URL: str
     QDRANT_API_KEY: str
     GEMINI_API_KEY: str
     RATE_LIMIT: int = 15
     TIME_WINDOW_SECONDS: int = 60
+    USER_RATE_LIMIT: int = 10
+    REDIS_URL: str = ""
+    QDRANT_POOL_SIZE: int = 20
+    RETRIEVAL_TOP_K: int = 4
+    RETRIEVAL_TIMEOUT_SECONDS: float = 10.0
+    RETRIEVAL_HYBRID: bool = True
+    RETRIEVAL_CANDIDATES: int = 20
+    RETRIEVAL_RRF_K: int = 60
+    RETRIEVAL_TERM_WEIGHT: float = 0.15
+    RETRIEVAL_MMR_LAMBDA: float = 0.7
+    RETRIEVAL_DUPLICATE_THRESHOLD: float = 0.95
+    RETRIEVAL_CONTEXT_TOKENS: int = 2000
+    SPARSE_INDEX_CACHE_SIZE: int = 64
+    SPARSE_INDEX_CACHE_TTL_SECONDS: int = 600
+    LLM_MODEL: str = "gemini-2.0-flash"
+    LLM_MAX_CONNECTIONS: int = 100
+    LLM_TIMEOUT_SECONDS: float = 60.0
+    LLM_COALESCE_CHARS: int = 48
+    LLM_COALESCE_MS: int = 50
+    EMBEDDING_BACKEND: str = "google"
+    FASTEMBED_MODEL: str = "BAAI/bge-small-en-v1.5"
+    FASTEMBED_THREADS: int | None = None
+    FASTEMBED_BATCH_SIZE: int = 64
+    FASTEMBED_CACHE_DIR: str | None = None
+    EMBEDDING_CACHE_SIZE: int = 5000
+    EMBEDDING_CACHE_TTL_SECONDS: int = 3600
+    EMBEDDING_CACHE_PATH: str = ""
+    EMBED_BATCH_SIZE: int = 64
+    EMBED_CONCURRENCY: int = 4
+    EMBED_MAX_RETRIES: int = 3
+    EMBED_RETRY_BACKOFF_SECONDS: float = 0.5
+    CHUNK_SIZE: int = 1000
+    CHUNK_OVERLAP: int = 100
+    UPLOAD_CHUNK_BYTES: int = 1024 * 1024
+    UPLOAD_TMP_DIR: str | None = None
+    # Match uploads against documents stored under the old latin1 text hash
+    LEGACY_HASH_COMPAT: bool = True
+    PDF_EXTRACT_WORKERS: int = 0
+    PDF_PARALLEL_MIN_PAGES: int = 100
+    PDF_PAGES_PER_TASK: int = 25
+    CHAT_MEMORY_TOKEN_BUDGET: int = 6000
+    CHAT_MEMORY_MAX_TURNS: int = 20
+    SESSION_CACHE_SIZE: int = 2000
+    SESSION_CACHE_TTL_SECONDS: int = 900
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_DOCUMENTS: int = 1000
+    ANSWER_CACHE_PER_DOCUMENT: int = 200
+    ANSWER_CACHE_TTL_SECONDS: int = 3600
+    ANSWER_CACHE_THRESHOLD: float = 0.95
+    MESSAGE_FLUSH_BATCH_SIZE: int = 200
+    MESSAGE_FLUSH_INTERVAL_MS: int = 500
+    MESSAGE_QUEUE_SIZE: int = 10000
+    MESSAGE_DURABILITY: str = "async"
+    WS_MAX_CONNECTIONS: int = 1000
+    WS_MAX_CONNECTIONS_PER_USER: int = 5
+    WS_SEND_QUEUE_SIZE: int = 256
+    WS_SEND_TIMEOUT_SECONDS: float = 10.0
+    WS_IDLE_TIMEOUT_SECONDS: int = 600
+    WS_HEARTBEAT_SECONDS: int = 25
+    WS_DRAIN_SECONDS: float = 20.0
+    SERVER_HOST: str = "127.0.0.1"
+    SERVER_PORT: int = 8000
+    INGEST_WORKERS: int = 2
+    INGEST_QUEUE_SIZE: int = 8
+    # Workers touch their jobs this often; a job untouched for STALE seconds
+    # belongs to a worker that died and no longer blocks new uploads
+    INGEST_HEARTBEAT_SECONDS: int = 30
+    INGEST_JOB_STALE_SECONDS: int = 180
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,61 @@
+import logging
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# Schema changes that create_all can't apply to existing tables.
+# Append only: each entry runs once per database, in order.
+MIGRATIONS = [
+    ("0001_shared_documents", [
+        # pdf_meta.hash used to be globally unique, now it's unique per user
+        "ALTER TABLE pdf_meta DROP CONSTRAINT IF EXISTS pdf_meta_hash_key",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_pdf_meta_user_hash ON pdf_meta (user_id, hash)",
+        "CREATE INDEX IF NOT EXISTS ix_pdf_meta_hash ON pdf_meta (hash)",
+        """
+        INSERT INTO documents (hash, status, ref_count, chunk_count, created_at)
+        SELECT hash, 'ready', count(*), 0, now() FROM pdf_meta
+        WHERE hash IS NOT NULL
+        GROUP BY hash
+        ON CONFLICT (hash) DO NOTHING
+        """,
+    ]),
+    ("0002_document_splitter", [
+        "ALTER TABLE documents ADD COLUMN IF NOT EXISTS splitter VARCHAR",
+    ]),
+    ("0003_chat_indexes", [
+        # pdf_meta.user_id lookups are already served by uq_pdf_meta_user_hash
+        "CREATE INDEX IF NOT EXISTS ix_chat_messages_session_created ON chat_messages (session_id, created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_chat_sessions_user_id ON chat_sessions (user_id)",
+        "CREATE INDEX IF NOT EXISTS ix_chat_sessions_pdf_id ON chat_sessions (pdf_id)",
+        "ANALYZE chat_messages",
+        "ANALYZE chat_sessions",
+    ]),
+    ("0004_document_content_sha256", [
+        # Legacy rows stay NULL until resolve_document_hash backfills them
+        "ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_sha256 VARCHAR",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_documents_content_sha256 ON documents (content_sha256)",
+    ]),
+]
+
+# Arbitrary constant, serializes migrations when several workers boot at once
+MIGRATION_LOCK_ID = 7266001
+
+
+async def run_migrations(conn):
+    await conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+    await conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations (id TEXT PRIMARY KEY, applied_at TIMESTAMP DEFAULT now())"
+    ))
+    result = await conn.execute(text("SELECT id FROM schema_migrations"))
+    applied = {row[0] for row in result}
+
+    for migration_id, statements in MIGRATIONS:
+        if migration_id in applied:
+            continue
+        for statement in statements:
+            await conn.execute(text(statement))
+        await conn.execute(
+            text("INSERT INTO schema_migrations (id) VALUES (:id)"), {"id": migration_id}
+        )
+        logger.info("Applied migration", extra={"migration": migration_id})
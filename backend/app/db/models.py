@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, ForeignKey, DateTime, Text
+from sqlalchemy import Column, String, ForeignKey, DateTime, Text, Integer, UniqueConstraint, Index, LargeBinary
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
@@ -16,12 +16,53 @@ class User(Base):
     password = Column(String)
 
 
+class Document(Base):
+    """One embedded copy per PDF content hash, shared by every PDFMeta with that hash."""
+    __tablename__ = "documents"
+    __table_args__ = (
+        Index("uq_documents_content_sha256", "content_sha256", unique=True),
+    )
+    hash = Column(String, primary_key=True)
+    # sha256 of the raw file bytes. Equal to hash for documents created since
+    # 0004; older ones are keyed by the latin1 text hash and get this filled
+    # in the first time their file is uploaded again.
+    content_sha256 = Column(String, nullable=True)
+    status = Column(String, default="pending")
+    ref_count = Column(Integer, default=0)
+    chunk_count = Column(Integer, default=0)
+    splitter = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+
+
+class DocumentChunk(Base):
+    """Local index of the points stored in Qdrant for a document, keyed by chunk content hash."""
+    __tablename__ = "document_chunks"
+    __table_args__ = (
+        Index("ix_document_chunks_document_chunk", "document_hash", "chunk_hash"),
+    )
+    point_id = Column(UUID(as_uuid=True), primary_key=True)
+    document_hash = Column(String, nullable=False)
+    chunk_hash = Column(String, nullable=False)
+
+
+class SparseIndex(Base):
+    """Serialized BM25 index over a document's chunks, see services/sparse_index.py."""
+    __tablename__ = "sparse_indexes"
+    document_hash = Column(String, primary_key=True)
+    chunk_count = Column(Integer, default=0)
+    data = Column(LargeBinary, nullable=False)
+    built_at = Column(DateTime, default=datetime.now)
+
+
 class PDFMeta(Base):
     __tablename__ = "pdf_meta"
+    __table_args__ = (
+        UniqueConstraint("user_id", "hash", name="uq_pdf_meta_user_hash"),
+    )
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
     name = Column(String)
-    hash = Column(String, unique=True)
+    hash = Column(String, index=True)
 
     chat_sessions = relationship("ChatSession", back_populates="pdf")
 
@@ -29,16 +70,36 @@ class PDFMeta(Base):
 class ChatSession(Base):
     __tablename__ = "chat_sessions"
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
-    pdf_id = Column(UUID(as_uuid=True), ForeignKey("pdf_meta.id"))
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), index=True)
+    pdf_id = Column(UUID(as_uuid=True), ForeignKey("pdf_meta.id"), index=True)
 
     pdf = relationship("PDFMeta", back_populates="chat_sessions")
 
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        # History loads filter on session_id and page on (created_at, id)
+        Index("ix_chat_messages_session_created", "session_id", "created_at", "id"),
+    )
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     session_id = Column(UUID(as_uuid=True), ForeignKey("chat_sessions.id"))
     role = Column(String)
     content = Column(Text)
     created_at = Column(DateTime, default=datetime.now)
+
+
+class IngestionJob(Base):
+    __tablename__ = "ingestion_jobs"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    pdf_id = Column(UUID(as_uuid=True), ForeignKey("pdf_meta.id"))
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
+    pdf_hash = Column(String, index=True)
+    status = Column(String, default="queued")
+    stage = Column(String, default="queued")
+    progress = Column(Integer, default=0)
+    chunks_total = Column(Integer, default=0)
+    chunks_done = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
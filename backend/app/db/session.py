@@ -2,9 +2,11 @@ from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from app.core.settings import settings
 from app.db import models  # Import your models here
+from app.db.migrations import run_migrations
 from sqlalchemy.future import select
 from contextlib import asynccontextmanager
 from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
+from uuid import uuid4
 
 def prepare_database_url(url: str) -> tuple[str, dict]:
     """
@@ -46,15 +48,52 @@ def prepare_database_url(url: str) -> tuple[str, dict]:
     
     return clean_url, connect_args
 
+def is_behind_pooler(url: str) -> bool:
+    if settings.DB_BEHIND_POOLER is not None:
+        return settings.DB_BEHIND_POOLER
+    parsed = urlparse(url)
+    # Supabase's transaction pooler listens on 6543
+    return 'pooler' in url.lower() or 'pgbouncer' in url.lower() or parsed.port == 6543
+
+
+def statement_cache_args(url: str) -> dict:
+    """
+    Prepared statement settings for asyncpg. Transaction-mode poolers hand
+    each transaction to a different server connection, so cached prepared
+    statements must be off and their names unique.
+    """
+    if not is_behind_pooler(url):
+        return {
+            'statement_cache_size': settings.DB_STATEMENT_CACHE_SIZE,
+            'prepared_statement_cache_size': settings.DB_STATEMENT_CACHE_SIZE,
+        }
+    return {
+        'statement_cache_size': 0,
+        'prepared_statement_cache_size': 0,
+        'prepared_statement_name_func': lambda: f"__asyncpg_{uuid4()}__",
+    }
+
 # Prepare database URL and connection args
 db_url, connect_args = prepare_database_url(settings.DATABASE_URL)
-engine = create_async_engine(db_url, echo=True, future=True, connect_args=connect_args)
+connect_args.update(statement_cache_args(settings.DATABASE_URL))
+engine = create_async_engine(
+    db_url,
+    echo=settings.DB_ECHO,
+    future=True,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+    pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    connect_args=connect_args,
+)
 
 SessionLocal = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
 
 async def create_tables():
     async with engine.begin() as conn:
         await conn.run_sync(models.Base.metadata.create_all)
+        await run_migrations(conn)
 
 @asynccontextmanager
 async def lifespan(app):
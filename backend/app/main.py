@@ -1,18 +1,40 @@
 from fastapi import FastAPI
-import asyncio
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from contextlib import asynccontextmanager
 from app.api.v1 import auth,chat,pdf,ping,chat_data
 from app.middleware.cors import setup_cors
 from app.db.session import create_tables,lifespan
+from app.services.ingestion import pipeline
+from app.core.redis import close_redis
+from app.core.services import services
+from app.core import metrics
+from app.core.log import setup_logging
+from app.core.security import prepare_dummy_hash
+from app.services.message_sink import message_sink
+from app.services.connection_manager import connection_manager
+from app.services.vector_store import ensure_collection
+
+setup_logging()
 
 @asynccontextmanager
 async def lifespan(app:FastAPI):
     await create_tables()
-    task = asyncio.create_task(chat.cleanup_request_times())
+    await prepare_dummy_hash()
+    # Clients and the Qdrant schema come up in the background, /ready reports when
+    services.start(["embedder", "qdrant", "llm"], setup=[ensure_collection])
+    await pipeline.start()
+    await message_sink.start()
     yield
-    task.cancel()
+    # Sockets first, their last answers still need the message sink. Under
+    # app.server this already ran before uvicorn closed the connections; under
+    # plain `uvicorn app.main:app` they were closed with 1012 before this point
+    await connection_manager.drain()
+    await pipeline.stop()
+    await message_sink.stop()
+    await services.close()
+    await close_redis()
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 setup_cors(app)
 
 
@@ -21,8 +43,14 @@ app.include_router(auth.router,prefix="/api/v1/auth"),
 app.include_router(pdf.router,prefix="/api/v1/pdf")
 app.include_router(chat.router,prefix="/api/v1/chat")
 app.include_router(chat_data.router,prefix="/api/v1/chat_data")
+app.include_router(ping.router,prefix="/api/v1/ping")
 
 
 @app.get('/')
 async def root():
-    return {"message":"chat with pdf AI is live"}
\ No newline at end of file
+    return {"message":"chat with pdf AI is live"}
+
+
+@app.get('/metrics', include_in_schema=False)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
\ No newline at end of file
@@ -0,0 +1,32 @@
+import uvicorn
+
+from app.core.settings import settings
+from app.services.connection_manager import connection_manager
+
+
+class Server(uvicorn.Server):
+    """
+    uvicorn closes every open websocket with 1012 before it runs the lifespan
+    shutdown, so draining there is too late for answers in progress. This
+    server drains the chat sockets as soon as the shutdown signal arrives,
+    before uvicorn touches the connections.
+    """
+
+    async def shutdown(self, sockets=None):
+        await connection_manager.drain()
+        await super().shutdown(sockets=sockets)
+
+
+def main():
+    config = uvicorn.Config(
+        "app.main:app",
+        host=settings.SERVER_HOST,
+        port=settings.SERVER_PORT,
+        # Room for the drain on top of uvicorn's own wait
+        timeout_graceful_shutdown=int(settings.WS_DRAIN_SECONDS) + 10,
+    )
+    Server(config).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import time
+from collections import OrderedDict
+
+import numpy as np
+from cachetools import TTLCache
+
+from app.core.settings import settings
+from app.core.metrics import cache_requests_total
+from app.services.embedding_cache import normalize
+
+
+def unit(vector) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm else array
+
+
+class DocumentAnswers:
+    """Answers cached for one document, least recently used first."""
+
+    def __init__(self, maxsize: int, ttl: int):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries: OrderedDict[str, tuple[np.ndarray, str, float]] = OrderedDict()
+        self._keys: list[str] = []
+        self._matrix: np.ndarray | None = None
+
+    def _expire(self):
+        now = time.monotonic()
+        expired = [key for key, (_, _, expires_at) in self.entries.items() if expires_at <= now]
+        for key in expired:
+            del self.entries[key]
+        if expired:
+            self._matrix = None
+
+    def match(self, query: np.ndarray, threshold: float) -> str | None:
+        self._expire()
+        if not self.entries:
+            return None
+        if self._matrix is None:
+            self._keys = list(self.entries)
+            self._matrix = np.stack([self.entries[key][0] for key in self._keys])
+        # Rows and query are unit length, so the dot product is the cosine
+        scores = self._matrix @ query
+        best = int(np.argmax(scores))
+        if scores[best] < threshold:
+            return None
+        key = self._keys[best]
+        self.entries.move_to_end(key)
+        return self.entries[key][1]
+
+    def add(self, key: str, vector: np.ndarray, answer: str):
+        self.entries[key] = (vector, answer, time.monotonic() + self.ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        self._matrix = None
+
+
+class AnswerCache:
+    """
+    Answers to history-independent questions, per document, looked up by
+    question embedding. A question whose cosine similarity to a cached one
+    reaches `threshold` is served the cached answer without calling the LLM.
+    Documents are evicted LRU with TTL, and each keeps at most `per_document`
+    answers.
+    """
+
+    def __init__(self, max_documents: int, per_document: int, ttl: int, threshold: float):
+        self.documents = TTLCache(maxsize=max_documents, ttl=ttl)
+        self.per_document = per_document
+        self.ttl = ttl
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, pdf_hash: str, vector: list[float]) -> str | None:
+        answers = self.documents.get(pdf_hash)
+        answer = answers.match(unit(vector), self.threshold) if answers else None
+        if answer is None:
+            self.misses += 1
+            cache_requests_total.inc("answer", "miss")
+        else:
+            self.hits += 1
+            cache_requests_total.inc("answer", "hit")
+        return answer
+
+    def put(self, pdf_hash: str, question: str, vector: list[float], answer: str):
+        answers = self.documents.get(pdf_hash) or DocumentAnswers(self.per_document, self.ttl)
+        answers.add(normalize(question), unit(vector), answer)
+        # Re-set so an actively used document's TTL starts over
+        self.documents[pdf_hash] = answers
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "documents": len(self.documents),
+            "answers": sum(len(answers.entries) for answers in self.documents.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+answer_cache = AnswerCache(
+    max_documents=settings.ANSWER_CACHE_DOCUMENTS,
+    per_document=settings.ANSWER_CACHE_PER_DOCUMENT,
+    ttl=settings.ANSWER_CACHE_TTL_SECONDS,
+    threshold=settings.ANSWER_CACHE_THRESHOLD,
+)
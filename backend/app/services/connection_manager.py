@@ -0,0 +1,216 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import WebSocket, WebSocketDisconnect, status
+
+from app.core.settings import settings
+from app.core.metrics import websocket_connections, websocket_rejected_total
+
+PING_FRAME = "__PING__"
+PONG_FRAME = "__PONG__"
+_CLOSE = object()
+
+
+class ConnectionRejected(Exception):
+    def __init__(self, code: int, reason: str):
+        super().__init__(reason)
+        self.code = code
+        self.reason = reason
+
+
+class Connection:
+    """
+    One admitted socket. Outgoing frames go through a bounded queue drained
+    by a sender task, so a slow client makes send() wait instead of letting
+    frames pile up in memory; one that stays stuck past the send timeout is
+    disconnected.
+    """
+
+    def __init__(self, manager: "ConnectionManager", websocket: WebSocket, user_id: str, heartbeat: bool):
+        self.manager = manager
+        self.websocket = websocket
+        self.user_id = user_id
+        self.heartbeat = heartbeat
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.WS_SEND_QUEUE_SIZE)
+        self.closed = asyncio.Event()
+        self.close_code: int | None = None
+        self.busy = False
+        # Client activity (questions and turns) drives the idle timeout,
+        # any frame at all, heartbeat replies included, proves the peer is alive
+        self.last_active = time.monotonic()
+        self.last_seen = self.last_active
+        self.sender = asyncio.create_task(self._send_loop())
+        self.monitor = asyncio.create_task(self._monitor())
+
+    async def send(self, text: str):
+        if self.closed.is_set():
+            raise WebSocketDisconnect(self.close_code or status.WS_1000_NORMAL_CLOSURE)
+        try:
+            await asyncio.wait_for(self.queue.put(text), settings.WS_SEND_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            self.manager.slow_consumers += 1
+            await self.close(status.WS_1013_TRY_AGAIN_LATER)
+            raise WebSocketDisconnect(status.WS_1013_TRY_AGAIN_LATER)
+
+    async def receive(self) -> str:
+        """The next text frame from the client, heartbeat replies aside."""
+        while True:
+            receive = asyncio.ensure_future(self.websocket.receive())
+            closed = asyncio.ensure_future(self.closed.wait())
+            try:
+                await asyncio.wait({receive, closed}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for task in (receive, closed):
+                    if not task.done():
+                        task.cancel()
+            if not receive.done() or receive.cancelled():
+                raise WebSocketDisconnect(self.close_code or status.WS_1000_NORMAL_CLOSURE)
+            message = receive.result()
+            if message["type"] == "websocket.disconnect":
+                self.closed.set()
+                raise WebSocketDisconnect(message.get("code", status.WS_1000_NORMAL_CLOSURE))
+            self.last_seen = time.monotonic()
+            text = message.get("text") or (message.get("bytes") or b"").decode()
+            if text != PONG_FRAME:
+                self.last_active = self.last_seen
+                return text
+
+    @asynccontextmanager
+    async def turn(self):
+        """Marks a question being answered, drain waits for it to finish."""
+        self.busy = True
+        try:
+            yield
+        finally:
+            self.busy = False
+            self.last_active = time.monotonic()
+
+    async def close(self, code: int = status.WS_1000_NORMAL_CLOSURE):
+        if self.close_code is not None:
+            return
+        self.close_code = code
+        # Let the sender flush what's queued, within the send timeout
+        try:
+            self.queue.put_nowait(_CLOSE)
+        except asyncio.QueueFull:
+            self.sender.cancel()
+        try:
+            await asyncio.wait_for(asyncio.shield(self.sender), settings.WS_SEND_TIMEOUT_SECONDS)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            self.sender.cancel()
+        if not self.closed.is_set():
+            self.closed.set()
+            try:
+                await self.websocket.close(code=code)
+            except Exception:
+                pass
+
+    async def _send_loop(self):
+        while True:
+            frame = await self.queue.get()
+            if frame is _CLOSE:
+                return
+            try:
+                await asyncio.wait_for(self.websocket.send_text(frame), settings.WS_SEND_TIMEOUT_SECONDS)
+            except Exception:
+                self.closed.set()
+                return
+
+    async def _monitor(self):
+        interval = min(settings.WS_HEARTBEAT_SECONDS, settings.WS_IDLE_TIMEOUT_SECONDS)
+        while not self.closed.is_set():
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            if not self.busy and now - self.last_active > settings.WS_IDLE_TIMEOUT_SECONDS:
+                self.manager.idle_closed += 1
+                await self.close(status.WS_1001_GOING_AWAY)
+                return
+            if self.heartbeat and now - self.last_seen > 2 * settings.WS_HEARTBEAT_SECONDS + interval:
+                # Two pings went unanswered
+                self.manager.unresponsive_closed += 1
+                await self.close(status.WS_1001_GOING_AWAY)
+                return
+            if self.heartbeat and not self.queue.full():
+                self.queue.put_nowait(PING_FRAME)
+
+
+class ConnectionManager:
+    """
+    Admission control for chat sockets: caps per node and per user, and
+    refuses new sockets while draining for shutdown. Every admitted socket
+    is released in a finally block, so nothing leaks on error paths.
+    """
+
+    def __init__(self, max_connections: int, max_per_user: int):
+        self.max_connections = max_connections
+        self.max_per_user = max_per_user
+        self.connections: set[Connection] = set()
+        self.by_user: dict[str, set[Connection]] = {}
+        self.draining = False
+        self.rejected = {"node": 0, "user": 0, "draining": 0}
+        self.slow_consumers = 0
+        self.idle_closed = 0
+        self.unresponsive_closed = 0
+        websocket_connections.set_function(lambda: len(self.connections))
+
+    def admit(self, websocket: WebSocket, user_id: str, heartbeat: bool = False) -> Connection:
+        if self.draining:
+            self.rejected["draining"] += 1
+            websocket_rejected_total.inc("draining")
+            raise ConnectionRejected(status.WS_1012_SERVICE_RESTART, "Server is restarting")
+        if len(self.connections) >= self.max_connections:
+            self.rejected["node"] += 1
+            websocket_rejected_total.inc("node")
+            raise ConnectionRejected(status.WS_1013_TRY_AGAIN_LATER, "Server is at capacity")
+        user_connections = self.by_user.setdefault(user_id, set())
+        if len(user_connections) >= self.max_per_user:
+            self.rejected["user"] += 1
+            websocket_rejected_total.inc("user")
+            raise ConnectionRejected(status.WS_1008_POLICY_VIOLATION, "Too many open chats")
+
+        connection = Connection(self, websocket, user_id, heartbeat)
+        self.connections.add(connection)
+        user_connections.add(connection)
+        return connection
+
+    async def release(self, connection: Connection, code: int = status.WS_1000_NORMAL_CLOSURE):
+        await connection.close(code)
+        connection.monitor.cancel()
+        self.connections.discard(connection)
+        user_connections = self.by_user.get(connection.user_id)
+        if user_connections is not None:
+            user_connections.discard(connection)
+            if not user_connections:
+                del self.by_user[connection.user_id]
+
+    async def drain(self, timeout: float | None = None):
+        """Stop admitting, let answers in progress finish, then close everything."""
+        self.draining = True
+        timeout = settings.WS_DRAIN_SECONDS if timeout is None else timeout
+        idle = [connection for connection in self.connections if not connection.busy]
+        await asyncio.gather(*(c.close(status.WS_1012_SERVICE_RESTART) for c in idle))
+        deadline = time.monotonic() + timeout
+        while any(c.busy for c in self.connections) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        await asyncio.gather(*(c.close(status.WS_1012_SERVICE_RESTART) for c in list(self.connections)))
+
+    def stats(self) -> dict:
+        return {
+            "connections": len(self.connections),
+            "max_connections": self.max_connections,
+            "users": len(self.by_user),
+            "busy": sum(1 for c in self.connections if c.busy),
+            "queued_frames": sum(c.queue.qsize() for c in self.connections),
+            "draining": self.draining,
+            "rejected": dict(self.rejected),
+            "slow_consumers_closed": self.slow_consumers,
+            "idle_closed": self.idle_closed,
+            "unresponsive_closed": self.unresponsive_closed,
+        }
+
+
+connection_manager = ConnectionManager(
+    max_connections=settings.WS_MAX_CONNECTIONS,
+    max_per_user=settings.WS_MAX_CONNECTIONS_PER_USER,
+)
@@ -0,0 +1,51 @@
+from collections import deque
+from app.core.settings import settings
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English text, close enough for budgeting
+    return len(text) // 4 + 1
+
+
+class ConversationMemory:
+    """
+    Per-socket chat memory with a token budget.
+    Past turns are kept as plain question/answer pairs; only the latest
+    retrieved context is sent, attached to the current question. The oldest
+    turns are dropped once the prompt would exceed the budget, so prompt size
+    stays flat however long the conversation runs.
+    """
+
+    def __init__(self, system_prompt: str, token_budget: int | None = None, max_turns: int | None = None):
+        self.system = {"role": "system", "content": system_prompt}
+        self.system_tokens = estimate_tokens(system_prompt)
+        self.token_budget = token_budget or settings.CHAT_MEMORY_TOKEN_BUDGET
+        self.turns: deque = deque(maxlen=max_turns or settings.CHAT_MEMORY_MAX_TURNS)
+        self.tokens = 0
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.turns
+
+    def add_turn(self, question: str, answer: str):
+        if len(self.turns) == self.turns.maxlen:
+            self.tokens -= self.turns[0][2]
+        tokens = estimate_tokens(question) + estimate_tokens(answer)
+        self.turns.append((question, answer, tokens))
+        self.tokens += tokens
+        self._trim(0)
+
+    def prompt(self, question: str, context: str) -> list[dict]:
+        current = f"{question}\n\nContext:\n{context}"
+        self._trim(estimate_tokens(current))
+
+        messages = [self.system]
+        for past_question, answer, _ in self.turns:
+            messages.append({"role": "user", "content": past_question})
+            messages.append({"role": "assistant", "content": answer})
+        messages.append({"role": "user", "content": current})
+        return messages
+
+    def _trim(self, reserve: int):
+        while self.turns and self.system_tokens + self.tokens + reserve > self.token_budget:
+            self.tokens -= self.turns.popleft()[2]
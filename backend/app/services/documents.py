@@ -0,0 +1,135 @@
+from sqlalchemy import select, delete, update
+from sqlalchemy.dialects.postgresql import insert
+
+from app.core.settings import settings
+from app.db.models import Document, PDFMeta
+from app.db.session import SessionLocal
+from app.services.vector_store import delete_pdf_embeddings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# New documents always get content_sha256, so once no legacy row is left
+# there is nothing to look for anymore
+_legacy_documents_left = True
+
+
+def legacy_hash_needed() -> bool:
+    """Whether uploads still need the pre-0004 hash to find their document."""
+    return settings.LEGACY_HASH_COMPAT and _legacy_documents_left
+
+
+async def resolve_document_hash(db, content_sha256: str, legacy_hash: str | None) -> str:
+    """
+    The document hash to use for an upload. Documents created before 0004
+    are keyed by the latin1 text hash, which spool_upload computes alongside
+    while legacy_hash_needed(); when one matches, its content_sha256 is backfilled so
+    later uploads resolve with one lookup.
+    """
+    global _legacy_documents_left
+    result = await db.execute(
+        select(Document.hash).where(Document.content_sha256 == content_sha256)
+    )
+    known = result.scalar_one_or_none()
+    if known:
+        return known
+    if legacy_hash is None or not _legacy_documents_left:
+        return content_sha256
+
+    result = await db.execute(
+        select(Document.hash).where(Document.content_sha256.is_(None)).limit(1)
+    )
+    if result.first() is None:
+        _legacy_documents_left = False
+        return content_sha256
+
+    await db.execute(
+        update(Document)
+        .where(Document.hash == legacy_hash, Document.content_sha256.is_(None))
+        .values(content_sha256=content_sha256)
+    )
+    # Read back rather than trusting the update: a concurrent upload of the
+    # same file may have backfilled it first
+    result = await db.execute(
+        select(Document.hash).where(Document.content_sha256 == content_sha256)
+    )
+    return result.scalar_one_or_none() or content_sha256
+
+
+async def lock_document(db, pdf_hash: str, content_sha256: str | None = None) -> Document:
+    """Lock the shared document for `pdf_hash`, creating it if needed. Runs in the caller's transaction."""
+    await db.execute(
+        insert(Document)
+        .values(hash=pdf_hash, content_sha256=content_sha256, status="pending", ref_count=0, chunk_count=0)
+        .on_conflict_do_nothing(index_elements=[Document.hash])
+    )
+    result = await db.execute(
+        select(Document).where(Document.hash == pdf_hash).with_for_update()
+    )
+    return result.scalar_one()
+
+
+async def acquire_document(db, pdf_hash: str, content_sha256: str | None = None) -> Document:
+    """Like lock_document, and also take a reference for a new PDFMeta."""
+    document = await lock_document(db, pdf_hash, content_sha256)
+    document.ref_count += 1
+    return document
+
+
+async def release_document(pdf_hash: str):
+    """Drop one reference; the last one out removes the vectors and the document row."""
+    async with SessionLocal() as db:
+        result = await db.execute(
+            select(Document).where(Document.hash == pdf_hash).with_for_update()
+        )
+        document = result.scalar_one_or_none()
+        if not document:
+            return
+        document.ref_count = max(document.ref_count - 1, 0)
+        # A running ingestion purges the document itself once it finishes
+        purge = document.ref_count == 0 and document.status != "pending"
+        if purge:
+            await db.execute(delete(Document).where(Document.hash == pdf_hash))
+        await db.commit()
+
+    if purge:
+        await delete_pdf_embeddings(pdf_hash)
+        logger.info("Removed unreferenced document", extra={"pdf_hash": pdf_hash})
+
+
+async def finish_document(pdf_hash: str, status: str, chunk_count: int = 0, splitter: str | None = None):
+    async with SessionLocal() as db:
+        result = await db.execute(
+            select(Document).where(Document.hash == pdf_hash).with_for_update()
+        )
+        document = result.scalar_one_or_none()
+        orphaned = document is None or document.ref_count == 0
+        if document and orphaned:
+            await db.execute(delete(Document).where(Document.hash == pdf_hash))
+        elif document and status == "ready":
+            document.status = status
+            document.chunk_count = chunk_count
+            document.splitter = splitter
+        elif document and document.status != "ready":
+            # A failed re-index leaves the previous, still complete copy in place
+            document.status = status
+        await db.commit()
+
+    if orphaned and status == "ready":
+        # Every owner went away while it was being ingested
+        await delete_pdf_embeddings(pdf_hash)
+
+
+async def switch_revision(pdf_id, old_hash: str, new_hash: str):
+    """Point a PDF at its newly ingested revision and drop its reference on the old one."""
+    async with SessionLocal() as db:
+        result = await db.execute(
+            update(PDFMeta).where(PDFMeta.id == pdf_id, PDFMeta.hash == old_hash).values(hash=new_hash)
+        )
+        await db.commit()
+    if result.rowcount:
+        await release_document(old_hash)
+    else:
+        # The PDF was deleted meanwhile, which released old_hash already, or
+        # moved to another revision; nobody holds the reference taken for this one
+        await release_document(new_hash)
@@ -0,0 +1,62 @@
+from dataclasses import dataclass
+from langchain_core.embeddings import Embeddings
+from app.core.settings import settings
+
+
+@dataclass
+class EmbeddingBackend:
+    name: str
+    model_name: str
+    dimension: int
+    embeddings: Embeddings
+
+    @property
+    def collection_suffix(self) -> str:
+        return f"{self.name}_{self.dimension}"
+
+
+def google_backend() -> EmbeddingBackend:
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+    model = "models/text-embedding-004"
+    return EmbeddingBackend(
+        name="google",
+        model_name=model,
+        dimension=768,
+        embeddings=GoogleGenerativeAIEmbeddings(
+            model=model,
+            google_api_key=settings.GEMINI_API_KEY
+        ),
+    )
+
+
+def fastembed_backend() -> EmbeddingBackend:
+    # Local ONNX inference, no network calls or quota once the model is cached
+    from langchain_community.embeddings.fastembed import FastEmbedEmbeddings
+
+    embeddings = FastEmbedEmbeddings(
+        model_name=settings.FASTEMBED_MODEL,
+        threads=settings.FASTEMBED_THREADS,
+        batch_size=settings.FASTEMBED_BATCH_SIZE,
+        cache_dir=settings.FASTEMBED_CACHE_DIR,
+    )
+    # Embedding a probe loads the ONNX session up front and tells us the dimension
+    dimension = len(embeddings.embed_query("dimension probe"))
+    return EmbeddingBackend(
+        name="fastembed",
+        model_name=settings.FASTEMBED_MODEL,
+        dimension=dimension,
+        embeddings=embeddings,
+    )
+
+
+BACKENDS = {
+    "google": google_backend,
+    "fastembed": fastembed_backend,
+}
+
+
+def load_backend(name: str) -> EmbeddingBackend:
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{name}', expected one of {list(BACKENDS)}")
+    return BACKENDS[name]()
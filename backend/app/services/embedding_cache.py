@@ -0,0 +1,136 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+
+from cachetools import TTLCache
+from langchain_core.embeddings import Embeddings
+
+from app.core.metrics import cache_requests_total, chat_stage_seconds
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+class DiskEmbeddingCache:
+    """SQLite backed tier so cached vectors survive restarts and are shared by workers on a node."""
+
+    def __init__(self, path: str, ttl: int):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB, expires_at REAL)"
+        )
+
+    def get(self, key: str) -> list[float] | None:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT vector FROM embeddings WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+        if not row:
+            return None
+        return array("f", row[0]).tolist()
+
+    def set(self, key: str, vector: list[float]):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, vector, expires_at) VALUES (?, ?, ?)",
+                (key, array("f", vector).tobytes(), time.time() + self.ttl),
+            )
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embedder and caches query vectors by normalized text + model name.
+    Lookups go to an in-process LRU with TTL first, then the optional disk tier.
+    Document embeddings (ingestion) are passed straight through. The "embed"
+    chat stage is timed here, around the model call only, so a turn that
+    asks for the same vector twice is counted once.
+    """
+
+    def __init__(self, embedder: Embeddings, model_name: str, maxsize: int, ttl: int, path: str = ""):
+        self.embedder = embedder
+        self.model_name = model_name
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.lock = threading.Lock()
+        self.disk = DiskEmbeddingCache(path, ttl) if path else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{normalize(text)}".encode("utf-8")).hexdigest()
+
+    def _memory_get(self, key: str):
+        with self.lock:
+            vector = self.memory.get(key)
+            if vector is not None:
+                self.hits += 1
+                cache_requests_total.inc("embedding", "hit")
+            return vector
+
+    def _memory_set(self, key: str, vector: list[float]):
+        with self.lock:
+            self.memory[key] = vector
+
+    def _disk_get(self, key: str):
+        vector = self.disk.get(key) if self.disk else None
+        with self.lock:
+            if vector is None:
+                self.misses += 1
+                cache_requests_total.inc("embedding", "miss")
+            else:
+                self.disk_hits += 1
+                cache_requests_total.inc("embedding", "disk_hit")
+                self.memory[key] = vector
+        return vector
+
+    def embed_query(self, text: str) -> list[float]:
+        key = self.key(text)
+        vector = self._memory_get(key)
+        if vector is None:
+            vector = self._disk_get(key)
+        if vector is None:
+            vector = self.embedder.embed_query(text)
+            self._memory_set(key, vector)
+            if self.disk:
+                self.disk.set(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> list[float]:
+        key = self.key(text)
+        vector = self._memory_get(key)
+        if vector is None:
+            vector = await asyncio.to_thread(self._disk_get, key) if self.disk else self._disk_get(key)
+        if vector is None:
+            with chat_stage_seconds.time("embed"):
+                vector = await self.embedder.aembed_query(text)
+            self._memory_set(key, vector)
+            if self.disk:
+                await asyncio.to_thread(self.disk.set, key, vector)
+        return vector
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embedder.embed_documents(texts)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await self.embedder.aembed_documents(texts)
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "model": self.model_name,
+                "size": len(self.memory),
+                "maxsize": self.memory.maxsize,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
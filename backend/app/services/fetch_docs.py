@@ -1,30 +1,139 @@
-from app.services.vector_store import embedder
-from app.services.vector_store import VECTOR_COLLECTION_NAME
-from app.services.vector_store import QDRANT_URL,QDRANT_API_KEY
-from langchain_qdrant import QdrantVectorStore
-from qdrant_client import models
-
-
-retriever = QdrantVectorStore.from_existing_collection(
-    collection_name=VECTOR_COLLECTION_NAME,
-    embedding=embedder,
-    url=QDRANT_URL,
-    api_key=QDRANT_API_KEY
-)
-
-
-def relevent_chunks(query: str,pdf_id:str):
-    results = retriever.similarity_search(
-        query=query,
-        filter=models.Filter(
-            must=[
-                models.FieldCondition(
-                    key="metadata.pdf_id",
-                    match=models.MatchValue(value=pdf_id),
-                ),
-            ]
-        ),
-    )
-
-    docs = [{"text":doc.page_content,"metadata":doc.metadata} for doc in results]
+import asyncio
+import time
+import numpy as np
+from app.services.vector_store import get_embedder
+from app.services.vector_store import collection_name
+from app.services.vector_store import get_qdrant
+from app.services.vector_store import pdf_filter
+from app.services.sparse_index import sparse_indexes, tokenize
+from app.services.conversation_memory import estimate_tokens
+from app.core.settings import settings
+from app.core.metrics import chat_stage_seconds
+
+
+def rrf(*rankings: list[str]) -> dict[str, float]:
+    """Reciprocal rank fusion of ranked id lists."""
+    scores: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, id_ in enumerate(ranking):
+            scores[id_] = scores.get(id_, 0.0) + 1.0 / (settings.RETRIEVAL_RRF_K + rank + 1)
+    return scores
+
+
+def unit_rows(vectors: list) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def rerank(query: str, query_vector, points: list) -> tuple[list, np.ndarray, np.ndarray]:
+    """
+    Order candidates by cosine similarity to the question, boosted by the
+    share of question terms the chunk contains exactly. Returns the points,
+    their unit vectors and relevance scores, best first.
+    """
+    vectors = unit_rows([point.vector for point in points])
+    query_unit = unit_rows([query_vector])[0]
+    relevance = vectors @ query_unit
+    terms = set(tokenize(query))
+    if terms:
+        coverage = np.array([
+            len(terms & set(tokenize(point.payload.get("page_content", "")))) / len(terms)
+            for point in points
+        ], dtype=np.float32)
+        relevance = relevance + settings.RETRIEVAL_TERM_WEIGHT * coverage
+    order = np.argsort(-relevance)
+    return [points[i] for i in order], vectors[order], relevance[order]
+
+
+def select_chunks(points: list, vectors: np.ndarray, relevance: np.ndarray, k: int, budget: int) -> list:
+    """
+    MMR selection: each pick trades relevance against similarity to what is
+    already picked, near duplicates are skipped outright. Stops at k chunks
+    or once the next one would overflow the token budget.
+    """
+    selected: list[int] = []
+    tokens = 0
+    remaining = list(range(len(points)))
+    while remaining and len(selected) < k:
+        if selected:
+            redundancy = (vectors[remaining] @ vectors[selected].T).max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining), dtype=np.float32)
+        scores = settings.RETRIEVAL_MMR_LAMBDA * relevance[remaining] - (1 - settings.RETRIEVAL_MMR_LAMBDA) * redundancy
+        pick = int(np.argmax(scores))
+        index = remaining.pop(pick)
+        if redundancy[pick] >= settings.RETRIEVAL_DUPLICATE_THRESHOLD:
+            continue
+        cost = estimate_tokens(points[index].payload.get("page_content", ""))
+        if selected and tokens + cost > budget:
+            break
+        selected.append(index)
+        tokens += cost
+    return [points[i] for i in selected]
+
+
+def build_context(docs: list[dict]) -> str:
+    return "\n\n".join(doc["text"] for doc in docs)
+
+
+async def relevent_chunks(query: str, pdf_id: str, k: int | None = None, timeout: float | None = None):
+    """
+    Hybrid retrieval: dense search and the document's BM25 index each
+    nominate candidates, fused with RRF, reranked locally, then deduplicated
+    with MMR into at most k chunks within RETRIEVAL_CONTEXT_TOKENS.
+    """
+    k = k or settings.RETRIEVAL_TOP_K
+    timeout = timeout or settings.RETRIEVAL_TIMEOUT_SECONDS
+    candidates = max(settings.RETRIEVAL_CANDIDATES, k)
+
+    async def sparse_ids():
+        if not settings.RETRIEVAL_HYBRID:
+            return []
+        index = await sparse_indexes.get(pdf_id)
+        return [id_ for id_, _ in index.search(query, candidates)] if index else []
+
+    async def search():
+        embedder, client, name = await asyncio.gather(get_embedder(), get_qdrant(), collection_name())
+        vector, sparse = await asyncio.gather(embedder.aembed_query(query), sparse_ids())
+        started = time.perf_counter()
+        dense = await client.query_points(
+            collection_name=name,
+            query=vector,
+            query_filter=pdf_filter(pdf_id),
+            limit=candidates,
+            with_payload=True,
+            with_vectors=True,
+        )
+        points = {str(point.id): point for point in dense.points}
+        fused = rrf(list(points), sparse)
+        shortlist = sorted(fused, key=fused.get, reverse=True)[:candidates]
+        missing = [id_ for id_ in shortlist if id_ not in points]
+        if missing:
+            fetched = await client.retrieve(
+                collection_name=name,
+                ids=missing,
+                with_payload=True,
+                with_vectors=True,
+            )
+            points.update((str(point.id), point) for point in fetched)
+        # Ids from a stale sparse index may no longer exist
+        return vector, [points[id_] for id_ in shortlist if id_ in points], started
+
+    vector, points, started = await asyncio.wait_for(search(), timeout=timeout)
+    if not points:
+        return []
+
+    ranked, vectors, relevance = rerank(query, vector, points)
+    chosen = select_chunks(ranked, vectors, relevance, k, settings.RETRIEVAL_CONTEXT_TOKENS)
+    # Qdrant round trips plus fusion, rerank and MMR
+    chat_stage_seconds.observe(time.perf_counter() - started, "search")
+
+    docs = [
+        {
+            "text": point.payload.get("page_content", ""),
+            "metadata": point.payload.get("metadata", {}),
+        }
+        for point in chosen
+    ]
     return docs
@@ -0,0 +1,216 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from uuid import UUID
+
+from sqlalchemy import update
+
+from app.core.settings import settings
+from app.core.metrics import ingest_stage_seconds, ingest_jobs_total
+from app.db.models import IngestionJob
+from app.db.session import SessionLocal
+from app.services.pdf_processor import count_pages, iter_pdf_chunks, next_batch, remove_file, shutdown_process_pool, splitter_version
+from app.services.vector_store import upsert_pdf_embeddings
+from app.services.documents import finish_document, release_document, switch_revision
+from app.services.sparse_index import sparse_indexes
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionQueueFull(Exception):
+    pass
+
+
+@dataclass
+class IngestionTask:
+    job_id: UUID
+    pdf_hash: str
+    path: str
+    progress: int = 0
+    # Set when re-uploading a PDF: the PDFMeta to repoint and its previous hash
+    pdf_id: UUID | None = None
+    base_hash: str | None = None
+
+
+async def update_job(job_id: UUID, **values):
+    async with SessionLocal() as db:
+        await db.execute(
+            update(IngestionJob)
+            .where(IngestionJob.id == job_id)
+            .values(**values, updated_at=datetime.now())
+        )
+        await db.commit()
+
+
+class IngestionPipeline:
+    """
+    Streaming ingestion pipeline: parse -> chunk -> embed -> upsert.
+    Jobs wait in a bounded queue, so a backlog makes new uploads get rejected
+    instead of piling up. Within a job, pages are parsed lazily on a bounded
+    thread pool and pulled only as fast as the vector store writer can embed
+    them, which keeps memory flat regardless of document size.
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = workers
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.executor: ThreadPoolExecutor | None = None
+        self.tasks: list[asyncio.Task] = []
+        self.heartbeat: asyncio.Task | None = None
+        self.in_flight: dict[UUID, IngestionTask] = {}
+
+    def has_capacity(self) -> bool:
+        return not self.queue.full()
+
+    def submit(self, task: IngestionTask):
+        try:
+            self.queue.put_nowait(task)
+        except asyncio.QueueFull:
+            raise IngestionQueueFull()
+        self.in_flight[task.job_id] = task
+
+    async def start(self):
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="ingest"
+        )
+        for _ in range(self.workers):
+            self.tasks.append(asyncio.create_task(self._worker()))
+        self.heartbeat = asyncio.create_task(self._heartbeat())
+
+    async def stop(self):
+        if self.heartbeat:
+            self.heartbeat.cancel()
+            await asyncio.gather(self.heartbeat, return_exceptions=True)
+            self.heartbeat = None
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks.clear()
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        shutdown_process_pool()
+
+        # Jobs are held in memory only, anything unfinished is lost on shutdown
+        for task in list(self.in_flight.values()):
+            remove_file(task.path)
+            await self._fail(task, "Interrupted by server shutdown")
+        self.in_flight.clear()
+
+    async def _heartbeat(self):
+        """Keep updated_at of queued and running jobs fresh, see active_job."""
+        while True:
+            await asyncio.sleep(settings.INGEST_HEARTBEAT_SECONDS)
+            if not self.in_flight:
+                continue
+            try:
+                async with SessionLocal() as db:
+                    await db.execute(
+                        update(IngestionJob)
+                        .where(IngestionJob.id.in_(list(self.in_flight)))
+                        .values(updated_at=datetime.now())
+                    )
+                    await db.commit()
+            except Exception as e:
+                logger.warning("Ingestion heartbeat failed", extra={"error": str(e)})
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, fn, *args)
+
+    async def _fail(self, task: IngestionTask, error: str):
+        await update_job(task.job_id, status="failed", error=error)
+        await finish_document(task.pdf_hash, "failed")
+        if task.base_hash:
+            # The PDF stays on its old revision, give back the reference taken for the new one
+            await release_document(task.pdf_hash)
+
+    async def _batches(self, task: IngestionTask, pages: int):
+        chunks = iter_pdf_chunks(task.path, pages)
+        loop = asyncio.get_running_loop()
+        parsing = None
+        try:
+            while True:
+                with ingest_stage_seconds.time("parse"):
+                    parsing = loop.run_in_executor(
+                        self.executor, next_batch, chunks, settings.EMBED_BATCH_SIZE
+                    )
+                    # Shielded so a cancellation leaves the future to wait on below
+                    batch = await asyncio.shield(parsing)
+                if not batch:
+                    break
+                page = batch[-1].metadata.get("page", 0) + 1
+                task.progress = min(95, 5 + int(90 * page / max(pages, 1)))
+                yield batch
+        finally:
+            if parsing is not None and not parsing.done():
+                # The thread is still inside the generator, it can't be closed before it returns
+                await asyncio.gather(parsing, return_exceptions=True)
+            chunks.close()
+
+    async def _worker(self):
+        while True:
+            task = await self.queue.get()
+            started = time.perf_counter()
+            try:
+                await self._ingest(task)
+                ingest_jobs_total.inc("completed")
+            except asyncio.CancelledError:
+                ingest_jobs_total.inc("cancelled")
+                await self._fail(task, "Interrupted by server shutdown")
+                raise
+            except Exception as e:
+                if asyncio.current_task().cancelling():
+                    # Raised while unwinding a cancellation, which must not be swallowed
+                    ingest_jobs_total.inc("cancelled")
+                    await self._fail(task, "Interrupted by server shutdown")
+                    raise asyncio.CancelledError() from e
+                ingest_jobs_total.inc("failed")
+                logger.exception("Ingestion job failed", extra={"job_id": task.job_id, "pdf_hash": task.pdf_hash})
+                await self._fail(task, str(e))
+            finally:
+                ingest_stage_seconds.observe(time.perf_counter() - started, "total")
+                remove_file(task.path)
+                self.in_flight.pop(task.job_id, None)
+                self.queue.task_done()
+
+    async def _ingest(self, task: IngestionTask):
+        await update_job(task.job_id, status="running", stage="processing", progress=1)
+        with ingest_stage_seconds.time("pages"):
+            pages = await self._run(count_pages, task.path)
+
+        async def on_progress(done: int):
+            await update_job(task.job_id, chunks_done=done, progress=task.progress)
+
+        with ingest_stage_seconds.time("write"):
+            written = await upsert_pdf_embeddings(
+                self._batches(task, pages), task.pdf_hash,
+                base_hash=task.base_hash, on_progress=on_progress
+            )
+        await update_job(task.job_id, stage="indexing", progress=96)
+        try:
+            with ingest_stage_seconds.time("sparse_index"):
+                await sparse_indexes.build(task.pdf_hash)
+        except Exception as e:
+            # Dense search still works, the index gets rebuilt lazily on first query
+            logger.warning("Sparse index build failed", extra={"pdf_hash": task.pdf_hash, "error": str(e)})
+        await finish_document(task.pdf_hash, "ready", written, splitter_version())
+        if task.base_hash:
+            await switch_revision(task.pdf_id, task.base_hash, task.pdf_hash)
+        await update_job(
+            task.job_id,
+            status="completed",
+            stage="completed",
+            progress=100,
+            chunks_total=written,
+            chunks_done=written,
+        )
+
+
+pipeline = IngestionPipeline(
+    workers=settings.INGEST_WORKERS,
+    queue_size=settings.INGEST_QUEUE_SIZE,
+)
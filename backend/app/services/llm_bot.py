@@ -1,11 +1,65 @@
-from openai import OpenAI
+from openai import AsyncOpenAI
 from app.core.settings import settings
+from app.core.services import services
+import httpx
+import time
 
 
-client = OpenAI(
-    api_key=settings.GEMINI_API_KEY,
-     base_url="https://generativelanguage.googleapis.com/v1beta/openai/"
-)
+def _create_client() -> AsyncOpenAI:
+    # One pooled HTTP/2 client shared by every conversation on this worker
+    http_client = httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_CONNECTIONS,
+        ),
+        timeout=httpx.Timeout(settings.LLM_TIMEOUT_SECONDS, connect=10.0),
+    )
+    return AsyncOpenAI(
+        api_key=settings.GEMINI_API_KEY,
+        base_url="https://generativelanguage.googleapis.com/v1beta/openai/",
+        http_client=http_client,
+    )
+
+
+services.register("llm", _create_client, close=lambda client: client.close())
+
+
+async def stream_completion(messages: list[dict]):
+    """
+    Stream the answer for `messages`, coalescing tokens into larger pieces.
+    A piece is flushed once it reaches LLM_COALESCE_CHARS characters or
+    LLM_COALESCE_MS has passed since the last flush; the first token is
+    always sent right away. Closing the generator aborts the upstream request.
+    """
+    stream = await (await services.aget("llm")).chat.completions.create(
+        model=settings.LLM_MODEL,
+        messages=messages,
+        stream=True
+    )
+
+    buffer = []
+    size = 0
+    last_flush = 0.0
+    try:
+        async for chunk in stream:
+            if not (chunk.choices and chunk.choices[0].delta.content):
+                continue
+            token = chunk.choices[0].delta.content
+            buffer.append(token)
+            size += len(token)
+
+            now = time.monotonic()
+            if size >= settings.LLM_COALESCE_CHARS or (now - last_flush) * 1000 >= settings.LLM_COALESCE_MS:
+                yield "".join(buffer)
+                buffer.clear()
+                size = 0
+                last_flush = now
+
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        await stream.close()
 
 
 system_prompt = """
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import time
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from app.core.settings import settings
+from app.db.models import ChatMessage
+from app.db.session import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Queued by stop(): the flusher commits what it holds, drains the rest and exits
+_STOP = object()
+
+
+class MessageSink:
+    """
+    Write-behind persistence for chat messages. Turns from every session are
+    queued and bulk-inserted by one background flusher whenever
+    MESSAGE_FLUSH_BATCH_SIZE rows are waiting or MESSAGE_FLUSH_INTERVAL_MS
+    has passed, and the queue is drained on shutdown.
+
+    Durability modes:
+      async - write() returns once the rows are queued (default)
+      sync  - write() waits until the batch holding the rows is committed
+    """
+
+    def __init__(self, batch_size: int, flush_interval_ms: int, max_queue: int, durability: str):
+        if durability not in ("async", "sync"):
+            raise ValueError(f"Unknown MESSAGE_DURABILITY '{durability}', expected 'async' or 'sync'")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.durability = durability
+        # A full queue makes write() wait, which slows chat down instead of growing memory
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.task: asyncio.Task | None = None
+        self.flushed = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_flush_ms = 0.0
+
+    async def write(self, rows: list[dict]):
+        future = asyncio.get_running_loop().create_future() if self.durability == "sync" else None
+        await self.queue.put((rows, future))
+        if future:
+            await future
+
+    async def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            # Not cancelled: rows the flusher already took would be lost
+            await self.queue.put(_STOP)
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        # Drain whatever is still queued before the process exits
+        await self._drain()
+
+    def stats(self) -> dict:
+        return {
+            "durability": self.durability,
+            "queue_depth": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "rows_flushed": self.flushed,
+            "rows_failed": self.failed,
+            "batches": self.batches,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+        }
+
+    async def _drain(self):
+        while not self.queue.empty():
+            items = []
+            while len(items) < self.batch_size and not self.queue.empty():
+                item = self.queue.get_nowait()
+                if item is not _STOP:
+                    items.append(item)
+            await self._flush(items)
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            items = []
+            item = await self.queue.get()
+            if item is _STOP:
+                stopping = True
+            else:
+                items.append(item)
+            deadline = time.monotonic() + self.flush_interval
+            while not stopping and sum(len(rows) for rows, _ in items) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                else:
+                    items.append(item)
+            await self._flush(items)
+        await self._drain()
+
+    async def _flush(self, items: list):
+        rows = [row for batch, _ in items for row in batch]
+        if not rows:
+            return
+        started = time.perf_counter()
+        error = await self._insert(rows)
+        if isinstance(error, IntegrityError):
+            # Typically a session deleted while its messages were queued. Retry
+            # session by session so it doesn't take other users' rows down with it
+            sessions: dict = {}
+            for batch, future in items:
+                # One write() holds one turn, so one session
+                sessions.setdefault(batch[0]["session_id"], []).append((batch, future))
+            outcomes = [
+                (group, await self._insert([row for batch, _ in group for row in batch]))
+                for group in sessions.values()
+            ]
+        else:
+            outcomes = [(items, error)]
+
+        self.last_flush_ms = (time.perf_counter() - started) * 1000
+        self.batches += 1
+        for group, error in outcomes:
+            count = sum(len(batch) for batch, _ in group)
+            if error is None:
+                self.flushed += count
+            else:
+                self.failed += count
+                logger.error("Dropping chat messages after failed flush", extra={"rows": count, "error": str(error)})
+            for _, future in group:
+                if future and not future.done():
+                    if error is None:
+                        future.set_result(None)
+                    else:
+                        future.set_exception(error)
+
+    async def _insert(self, rows: list[dict]) -> Exception | None:
+        """Insert in one transaction, retrying transient errors. Returns the error if it never went through."""
+        error = None
+        for attempt in range(3):
+            try:
+                async with SessionLocal() as db:
+                    await db.execute(insert(ChatMessage), rows)
+                    await db.commit()
+                return None
+            except IntegrityError as e:
+                # Fails the same way every time
+                return e
+            except Exception as e:
+                error = e
+                if attempt < 2:
+                    await asyncio.sleep(0.2 * 2 ** attempt)
+        return error
+
+message_sink = MessageSink(
+    batch_size=settings.MESSAGE_FLUSH_BATCH_SIZE,
+    flush_interval_ms=settings.MESSAGE_FLUSH_INTERVAL_MS,
+    max_queue=settings.MESSAGE_QUEUE_SIZE,
+    durability=settings.MESSAGE_DURABILITY,
+)
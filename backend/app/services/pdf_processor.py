@@ -1,17 +1,140 @@
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from pathlib import Path
+from langchain_core.documents import Document
+from fastapi import UploadFile
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from itertools import islice
+from pypdf import PdfReader
+from app.core.settings import settings
+from app.utils.hashing import Latin1Sha256
+import asyncio
+import hashlib
+import multiprocessing
+import os
 import tempfile
 
-def process_pdf(content: bytes):
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-        tmp.write(content)
-        tmp_path = tmp.name
+text_splitter = RecursiveCharacterTextSplitter(
+    chunk_size=settings.CHUNK_SIZE,
+    chunk_overlap=settings.CHUNK_OVERLAP,
+)
 
-    loader = PyPDFLoader(tmp_path)
-    docs = loader.load()
 
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-    split_docs = text_splitter.split_documents(docs)
+def splitter_version() -> str:
+    return f"recursive:{settings.CHUNK_SIZE}:{settings.CHUNK_OVERLAP}"
 
-    return split_docs
+
+async def spool_upload(file: UploadFile, legacy_hash: bool = False) -> tuple[str, str, str | None]:
+    """
+    Copy the upload to a temp file chunk by chunk, hashing the raw bytes as
+    it goes. Returns (path, content sha256, legacy hash); the legacy hash is
+    only computed when asked for, see legacy_hash_needed. The caller owns the
+    file and must remove it.
+    """
+    hasher = hashlib.sha256()
+    legacy = Latin1Sha256() if legacy_hash else None
+    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf", dir=settings.UPLOAD_TMP_DIR)
+    try:
+        with tmp:
+            while chunk := await file.read(settings.UPLOAD_CHUNK_BYTES):
+                view = memoryview(chunk)
+                hasher.update(view)
+                if legacy:
+                    legacy.update(chunk)
+                await asyncio.to_thread(tmp.write, view)
+    except BaseException:
+        remove_file(tmp.name)
+        raise
+    return tmp.name, hasher.hexdigest(), legacy.hexdigest() if legacy else None
+
+
+def remove_file(path: str | None):
+    if not path:
+        return
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def count_pages(path: str) -> int:
+    return len(PdfReader(path).pages)
+
+
+_process_pool: ProcessPoolExecutor | None = None
+
+
+def extract_workers() -> int:
+    return settings.PDF_EXTRACT_WORKERS or os.cpu_count() or 1
+
+
+def process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        # spawn, not fork: the parent runs an event loop and thread pools
+        _process_pool = ProcessPoolExecutor(
+            max_workers=extract_workers(),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _process_pool
+
+
+def shutdown_process_pool():
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+def extract_page_range(path: str, start: int, end: int) -> list[Document]:
+    """Runs in a worker process: extract and split pages [start, end)."""
+    reader = PdfReader(path)
+    total_pages = len(reader.pages)
+    labels = reader.page_labels
+    pages = [
+        Document(
+            page_content=reader.pages[i].extract_text(),
+            # Same page keys PyPDFLoader sets, so citations look identical
+            metadata={
+                "source": path,
+                "total_pages": total_pages,
+                "page": i,
+                "page_label": labels[i] if i < len(labels) else str(i + 1),
+            },
+        )
+        for i in range(start, end)
+    ]
+    return text_splitter.split_documents(pages)
+
+
+def iter_parallel_chunks(path: str, pages: int):
+    pool = process_pool()
+    step = settings.PDF_PAGES_PER_TASK
+    ranges = iter([(start, min(start + step, pages)) for start in range(0, pages, step)])
+    # Keep a bounded window of ranges in flight and yield them in page order
+    window = deque()
+    for start, end in islice(ranges, extract_workers() * 2):
+        window.append(pool.submit(extract_page_range, path, start, end))
+    try:
+        while window:
+            chunks = window.popleft().result()
+            for start, end in islice(ranges, 1):
+                window.append(pool.submit(extract_page_range, path, start, end))
+            yield from chunks
+    finally:
+        for future in window:
+            future.cancel()
+
+
+def iter_pdf_chunks(path: str, pages: int = 0):
+    # Small files aren't worth the process hop, parse them in-process
+    if pages >= settings.PDF_PARALLEL_MIN_PAGES and extract_workers() > 1:
+        yield from iter_parallel_chunks(path, pages)
+        return
+    # Pages are loaded one at a time, so only a single page is held in memory
+    for page in PyPDFLoader(path).lazy_load():
+        yield from text_splitter.split_documents([page])
+
+
+def next_batch(chunks, size: int) -> list:
+    return list(islice(chunks, size))
@@ -0,0 +1,138 @@
+import math
+import time
+from dataclasses import dataclass
+
+from cachetools import TTLCache
+
+from app.core.metrics import rate_limit_total
+from app.core.redis import get_redis
+from app.core.settings import settings
+
+
+@dataclass
+class RateLimitResult:
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_in: float
+
+    def to_dict(self):
+        return {
+            "allowed": self.allowed,
+            "limit": self.limit,
+            "remaining": self.remaining,
+            "reset_in": round(self.reset_in, 1),
+        }
+
+
+class InMemoryBackend:
+    """Token bucket per key, for a single process."""
+
+    def __init__(self, max_keys: int = 100_000, window: int = 60):
+        # An idle bucket refills completely within one window, so dropping it then is lossless
+        self.buckets = TTLCache(maxsize=max_keys, ttl=window)
+
+    async def hit(self, key: str, limit: int, window: int) -> RateLimitResult:
+        now = time.monotonic()
+        rate = limit / window
+        tokens, updated = self.buckets.get(key, (limit, now))
+        tokens = min(limit, tokens + (now - updated) * rate)
+
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self.buckets[key] = (tokens, now)
+        reset_in = 0.0 if allowed else (1 - tokens) / rate
+        return RateLimitResult(allowed, limit, int(tokens), reset_in)
+
+    async def refund(self, key: str, limit: int, window: int):
+        """Give back the token taken by an allowed hit."""
+        tokens, updated = self.buckets.get(key, (limit, time.monotonic()))
+        self.buckets[key] = (min(limit, tokens + 1), updated)
+
+
+# Sliding window counter: the previous window's count, weighted by how much
+# of it still overlaps the sliding window, plus the current window's count.
+SLIDING_WINDOW_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+local limit = tonumber(ARGV[1])
+local weight = tonumber(ARGV[2])
+local estimated = previous * weight + current
+if estimated + 1 > limit then
+    return {0, math.floor(limit - estimated)}
+end
+current = redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[3]))
+return {1, math.floor(limit - (previous * weight + current))}
+"""
+
+REFUND_SCRIPT = """
+if tonumber(redis.call('GET', KEYS[1]) or '0') > 0 then
+    redis.call('DECR', KEYS[1])
+end
+"""
+
+
+class RedisBackend:
+    """Sliding window counter shared by every worker through a Redis protocol server."""
+
+    def __init__(self, client, prefix: str = "ratelimit"):
+        self.client = client
+        self.prefix = prefix
+
+    async def hit(self, key: str, limit: int, window: int) -> RateLimitResult:
+        now = time.time()
+        current_window = math.floor(now / window)
+        elapsed = now - current_window * window
+        weight = 1 - elapsed / window
+        keys = [
+            f"{self.prefix}:{key}:{current_window}",
+            f"{self.prefix}:{key}:{current_window - 1}",
+        ]
+        allowed, remaining = await self.client.eval(
+            SLIDING_WINDOW_SCRIPT, len(keys), *keys, limit, weight, window * 2
+        )
+        return RateLimitResult(bool(allowed), limit, max(int(remaining), 0), window - elapsed)
+
+    async def refund(self, key: str, limit: int, window: int):
+        """Take back the count added by an allowed hit."""
+        current_window = math.floor(time.time() / window)
+        await self.client.eval(REFUND_SCRIPT, 1, f"{self.prefix}:{key}:{current_window}")
+
+
+class RateLimiter:
+    def __init__(self, backend, user_limit: int, global_limit: int, window: int):
+        self.backend = backend
+        self.user_limit = user_limit
+        self.global_limit = global_limit
+        self.window = window
+
+    async def check(self, user_id: str) -> RateLimitResult:
+        user = await self.backend.hit(f"user:{user_id}", self.user_limit, self.window)
+        if not user.allowed:
+            rate_limit_total.inc("user_limited")
+            return user
+        overall = await self.backend.hit("global", self.global_limit, self.window)
+        if not overall.allowed:
+            # The request isn't served, so it mustn't count against the user's quota
+            await self.backend.refund(f"user:{user_id}", self.user_limit, self.window)
+            rate_limit_total.inc("global_limited")
+            return overall
+        rate_limit_total.inc("allowed")
+        # Report whichever quota runs out first
+        return min(user, overall, key=lambda result: result.remaining)
+
+
+def create_rate_limiter() -> RateLimiter:
+    redis = get_redis()
+    backend = RedisBackend(redis) if redis else InMemoryBackend(window=settings.TIME_WINDOW_SECONDS)
+    return RateLimiter(
+        backend,
+        user_limit=settings.USER_RATE_LIMIT,
+        global_limit=settings.RATE_LIMIT,
+        window=settings.TIME_WINDOW_SECONDS,
+    )
+
+
+rate_limiter = create_rate_limiter()
@@ -0,0 +1,69 @@
+from collections import deque
+from uuid import UUID
+
+from cachetools import TTLCache
+from sqlalchemy import text
+
+from app.core.settings import settings
+from app.db.session import SessionLocal
+
+
+class SessionHistoryCache:
+    """
+    Recent question/answer turns per chat session, used to hydrate memory
+    when a socket reconnects. Served from an in-process LRU with TTL, which
+    also bounds how stale an entry can get when a session moves between
+    workers; misses cost one indexed query for the latest turns only.
+    """
+
+    def __init__(self, maxsize: int, ttl: int, max_turns: int):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.max_turns = max_turns
+
+    async def load(self, session_id: UUID) -> list[tuple[str, str]]:
+        turns = self.cache.get(session_id)
+        if turns is None:
+            turns = deque(await self._fetch(session_id), maxlen=self.max_turns)
+            self.cache[session_id] = turns
+        return list(turns)
+
+    def start(self, session_id: UUID):
+        """A brand-new session has no history, so its entry needs no query."""
+        self.cache[session_id] = deque(maxlen=self.max_turns)
+
+    def append(self, session_id: UUID, question: str, answer: str):
+        turns = self.cache.get(session_id)
+        if turns is None:
+            # Evicted. Seeding from the database here could miss turns still
+            # queued in the message sink; the next load() reads it once flushed
+            return
+        turns.append((question, answer))
+        # Re-set so an active session's TTL starts over
+        self.cache[session_id] = turns
+
+    async def _fetch(self, session_id: UUID) -> list[tuple[str, str]]:
+        async with SessionLocal() as db:
+            result = await db.execute(text("""
+                SELECT role, content FROM chat_messages
+                WHERE session_id = :s_id
+                ORDER BY created_at DESC
+                LIMIT :limit
+            """), {"s_id": session_id, "limit": self.max_turns * 2})
+            rows = list(reversed(result.fetchall()))
+
+        turns = []
+        question = None
+        for role, content in rows:
+            if role == "user":
+                question = content
+            elif role == "assistant" and question is not None:
+                turns.append((question, content))
+                question = None
+        return turns
+
+
+session_history = SessionHistoryCache(
+    maxsize=settings.SESSION_CACHE_SIZE,
+    ttl=settings.SESSION_CACHE_TTL_SECONDS,
+    max_turns=settings.CHAT_MEMORY_MAX_TURNS,
+)
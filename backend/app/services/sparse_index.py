@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import math
+import re
+import zlib
+from collections import Counter
+from datetime import datetime
+
+import orjson
+from cachetools import TTLCache
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from app.core.settings import settings
+from app.db.models import Document, SparseIndex
+from app.db.session import SessionLocal
+from app.services.vector_store import get_qdrant, collection_name, pdf_filter
+
+# Keeps dotted and dashed tokens whole, so clause numbers (4.2.1) and codes
+# (ISO-9001) match exactly
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[._/-][a-z0-9]+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have in is it its of on or that the "
+    "this to was were what when where which who why will with how do does can".split()
+)
+logger = logging.getLogger(__name__)
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> list[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25:
+    """In-memory BM25 over the chunks of one document."""
+
+    def __init__(self, ids: list[str], lengths: list[int], postings: dict[str, list[tuple[int, int]]]):
+        self.ids = ids
+        self.lengths = lengths
+        self.postings = postings
+        self.avg_length = sum(lengths) / len(lengths) if lengths else 0.0
+
+    @classmethod
+    def build(cls, chunks: list[tuple[str, str]]) -> "BM25":
+        ids, lengths, postings = [], [], {}
+        for index, (id_, text) in enumerate(chunks):
+            tokens = tokenize(text)
+            ids.append(id_)
+            lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, []).append((index, tf))
+        return cls(ids, lengths, postings)
+
+    def dumps(self) -> bytes:
+        return zlib.compress(orjson.dumps({
+            "ids": self.ids, "lengths": self.lengths, "postings": self.postings,
+        }))
+
+    @classmethod
+    def loads(cls, data: bytes) -> "BM25":
+        raw = orjson.loads(zlib.decompress(data))
+        postings = {term: [tuple(p) for p in plist] for term, plist in raw["postings"].items()}
+        return cls(raw["ids"], raw["lengths"], postings)
+
+    def search(self, query: str, limit: int) -> list[tuple[str, float]]:
+        count = len(self.ids)
+        scores: dict[int, float] = {}
+        for term in set(tokenize(query)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = math.log(1 + (count - len(plist) + 0.5) / (len(plist) + 0.5))
+            for index, tf in plist:
+                norm = 1 - BM25_B + BM25_B * self.lengths[index] / (self.avg_length or 1)
+                scores[index] = scores.get(index, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * norm)
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [(self.ids[index], score) for index, score in best]
+
+
+async def scroll_chunks(pdf_hash: str) -> list[tuple[str, str]]:
+    chunks, offset = [], None
+    while True:
+        points, offset = await (await get_qdrant()).scroll(
+            collection_name=await collection_name(),
+            scroll_filter=pdf_filter(pdf_hash),
+            limit=256,
+            offset=offset,
+            with_payload=["page_content"],
+            with_vectors=False,
+        )
+        chunks.extend((str(point.id), point.payload.get("page_content", "")) for point in points)
+        if offset is None:
+            return chunks
+
+
+class SparseIndexStore:
+    """
+    BM25 indexes per document hash. Built from the chunks in Qdrant after
+    ingestion and stored compressed in sparse_indexes, so every worker loads
+    the same index instead of rebuilding it. Loaded indexes are kept in an
+    LRU with TTL. Documents ingested before hybrid retrieval get theirs built
+    in the background on first use, once the document is ready.
+    """
+
+    def __init__(self, maxsize: int, ttl: int):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.building: dict[str, asyncio.Task] = {}
+
+    async def build(self, pdf_hash: str) -> BM25:
+        # Stamped before reading the chunks, so an older snapshot never wins
+        built_at = datetime.now()
+        chunks = await scroll_chunks(pdf_hash)
+        index = await asyncio.to_thread(BM25.build, chunks)
+        data = await asyncio.to_thread(index.dumps)
+        statement = insert(SparseIndex).values(
+            document_hash=pdf_hash, chunk_count=len(chunks), data=data, built_at=built_at
+        )
+        async with SessionLocal() as db:
+            result = await db.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[SparseIndex.document_hash],
+                    set_={"chunk_count": len(chunks), "data": data, "built_at": built_at},
+                    where=SparseIndex.built_at < statement.excluded.built_at,
+                )
+            )
+            await db.commit()
+        if result.rowcount:
+            self.cache[pdf_hash] = index
+        else:
+            # A newer build landed first, the next get() loads that one
+            self.cache.pop(pdf_hash, None)
+        return index
+
+    async def get(self, pdf_hash: str) -> BM25 | None:
+        """The loaded index, or None while it is missing and being built."""
+        index = self.cache.get(pdf_hash)
+        if index is not None:
+            return index
+        async with SessionLocal() as db:
+            result = await db.execute(
+                select(Document.status, SparseIndex.data)
+                .outerjoin(SparseIndex, SparseIndex.document_hash == Document.hash)
+                .where(Document.hash == pdf_hash)
+            )
+            row = result.first()
+        if row is None:
+            return None
+        status, data = row
+        if data is None:
+            # Chunks of a document still ingesting are incomplete, ingestion builds its index
+            if status == "ready":
+                self._build_in_background(pdf_hash)
+            return None
+        index = await asyncio.to_thread(BM25.loads, data)
+        self.cache[pdf_hash] = index
+        return index
+
+    def _build_in_background(self, pdf_hash: str):
+        if pdf_hash in self.building:
+            return
+
+        async def run():
+            try:
+                await self.build(pdf_hash)
+            except Exception as e:
+                logger.warning("Could not build sparse index", extra={"pdf_hash": pdf_hash, "error": str(e)})
+            finally:
+                self.building.pop(pdf_hash, None)
+
+        self.building[pdf_hash] = asyncio.create_task(run())
+
+
+sparse_indexes = SparseIndexStore(
+    maxsize=settings.SPARSE_INDEX_CACHE_SIZE,
+    ttl=settings.SPARSE_INDEX_CACHE_TTL_SECONDS,
+)
@@ -1,53 +1,347 @@
-from langchain_qdrant import QdrantVectorStore
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from app.core.settings import settings
-import os
-from qdrant_client import QdrantClient
+from app.core.services import services
+from app.core.metrics import ingest_stage_seconds
+from app.services.embedding_cache import CachedEmbeddings
+from app.services.embedding_backends import load_backend, EmbeddingBackend
+import asyncio
+import hashlib
+import httpx
+import logging
+import random
+import uuid
+from sqlalchemy import select, delete, text
+from sqlalchemy.dialects.postgresql import insert
+from app.db.models import DocumentChunk, SparseIndex
+from app.db.session import SessionLocal, engine
+from app.db.migrations import MIGRATION_LOCK_ID
+from app.services.pdf_processor import splitter_version
+from qdrant_client import AsyncQdrantClient, models
 from qdrant_client.models import PayloadSchemaType
 
-embedder = GoogleGenerativeAIEmbeddings(
-    model="models/text-embedding-004",
-    google_api_key=settings.GEMINI_API_KEY
-)
-
-VECTOR_COLLECTION_NAME = "chat_pdf"
-QDRANT_URL = settings.QDRANT_URL
-QDRANT_API_KEY = settings.QDRANT_API_KEY
-client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
-
-if VECTOR_COLLECTION_NAME not in [c.name for c in client.get_collections().collections]:
-    client.recreate_collection(
-        collection_name=VECTOR_COLLECTION_NAME,
-        vectors_config={
-            "size": 768, 
-            "distance": "Cosine"  
-        },
+logger = logging.getLogger(__name__)
+
+
+def _create_embedder() -> CachedEmbeddings:
+    # Runs on a warm-up thread, where blocking on the backend is fine
+    backend = services.get("embedding_backend")
+    return CachedEmbeddings(
+        backend.embeddings,
+        model_name=backend.model_name,
+        maxsize=settings.EMBEDDING_CACHE_SIZE,
+        ttl=settings.EMBEDDING_CACHE_TTL_SECONDS,
+        path=settings.EMBEDDING_CACHE_PATH,
+    )
+
+
+def _create_qdrant() -> AsyncQdrantClient:
+    # Shared by every chat turn so requests reuse one pooled set of connections
+    return AsyncQdrantClient(
+        url=settings.QDRANT_URL,
+        api_key=settings.QDRANT_API_KEY,
+        # Skips the synchronous server version request made in the constructor
+        check_compatibility=False,
+        # Extra kwargs go to the underlying httpx.AsyncClient
+        limits=httpx.Limits(
+            max_connections=settings.QDRANT_POOL_SIZE,
+            max_keepalive_connections=settings.QDRANT_POOL_SIZE,
+        ),
+    )
+
+
+services.register("embedding_backend", lambda: load_backend(settings.EMBEDDING_BACKEND))
+services.register("embedder", _create_embedder)
+services.register("qdrant", _create_qdrant, close=lambda client: client.close())
+
+
+async def get_embedding_backend() -> EmbeddingBackend:
+    return await services.aget("embedding_backend")
+
+
+async def get_embedder() -> CachedEmbeddings:
+    return await services.aget("embedder")
+
+
+async def get_qdrant() -> AsyncQdrantClient:
+    return await services.aget("qdrant")
+
+
+async def collection_name() -> str:
+    backend = await get_embedding_backend()
+    # Vectors of different backends can't share a collection, keep the original
+    # name for the google backend so existing data stays reachable
+    return "chat_pdf" if backend.name == "google" else f"chat_pdf_{backend.collection_suffix}"
+
+
+async def ensure_collection():
+    """
+    Create the collection and its metadata.pdf_id payload index (needed for
+    filtering by pdf_id). A marker in schema_migrations lets later boots
+    skip the index setup, but the collection itself is checked on every boot:
+    Qdrant can be reset or replaced independently of Postgres. The migration
+    lock keeps workers booting together from racing.
+    """
+    name = await collection_name()
+    marker = f"qdrant_collection:{name}"
+    client = await get_qdrant()
+    dimension = (await get_embedding_backend()).dimension
+    async with engine.begin() as conn:
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+        done = await conn.execute(text("SELECT 1 FROM schema_migrations WHERE id = :id"), {"id": marker})
+        exists = await client.collection_exists(name)
+        if done.first() and exists:
+            return
+
+        if not exists:
+            await client.create_collection(
+                collection_name=name,
+                vectors_config=models.VectorParams(
+                    size=dimension,
+                    distance=models.Distance.COSINE,
+                ),
+            )
+        try:
+            await client.create_payload_index(
+                collection_name=name,
+                field_name="metadata.pdf_id",
+                field_schema=PayloadSchemaType.KEYWORD
+            )
+        except Exception as e:
+            # Index might already exist, which is fine
+            if "already exists" not in str(e).lower() and "duplicate" not in str(e).lower():
+                raise
+        await conn.execute(
+            text("INSERT INTO schema_migrations (id) VALUES (:id) ON CONFLICT (id) DO NOTHING"), {"id": marker}
+        )
+        logger.info("Set up Qdrant collection", extra={"collection": name})
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def point_id(pdf_hash: str, chunk_hash: str, occurrence: int = 0) -> str:
+    # Ids derive from chunk content, so an unchanged chunk keeps its id across
+    # re-ingests and a retried batch overwrites itself instead of duplicating
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{pdf_hash}:{chunk_hash}:{occurrence}"))
+
+
+def pdf_filter(pdf_hash: str) -> models.Filter:
+    return models.Filter(
+        must=[
+            models.FieldCondition(
+                key="metadata.pdf_id",
+                match=models.MatchValue(value=pdf_hash),
+            ),
+        ]
     )
 
-# Create payload index for metadata.pdf_id to enable filtering
-# This is required for filtering by pdf_id in queries
-try:
-    client.create_payload_index(
-        collection_name=VECTOR_COLLECTION_NAME,
-        field_name="metadata.pdf_id",
-        field_schema=PayloadSchemaType.KEYWORD
+
+async def delete_pdf_embeddings(pdf_hash: str):
+    await (await get_qdrant()).delete(
+        collection_name=await collection_name(),
+        points_selector=models.FilterSelector(filter=pdf_filter(pdf_hash)),
     )
-    print(f"Created payload index for metadata.pdf_id in collection {VECTOR_COLLECTION_NAME}")
-except Exception as e:
-    # Index might already exist, which is fine
-    if "already exists" not in str(e).lower() and "duplicate" not in str(e).lower():
-        print(f"Warning: Could not create payload index (might already exist): {e}")
-
-def upsert_pdf_embeddings(chunks=[], pdf_hash: str=""):
-    for i, chunk in enumerate(chunks):
-        chunk.metadata["pdf_id"] = pdf_hash
-    print(pdf_hash,"-------------------------------------------")
-    vector_store = QdrantVectorStore.from_documents(
-        documents=chunks,
-        collection_name=VECTOR_COLLECTION_NAME,
-        url=QDRANT_URL,
-        api_key=QDRANT_API_KEY,
-        embedding=embedder
+    async with SessionLocal() as db:
+        await db.execute(delete(DocumentChunk).where(DocumentChunk.document_hash == pdf_hash))
+        await db.execute(delete(SparseIndex).where(SparseIndex.document_hash == pdf_hash))
+        await db.commit()
+
+
+async def delete_points(pdf_hash: str, ids: list[str]):
+    if not ids:
+        return
+    await (await get_qdrant()).delete(
+        collection_name=await collection_name(),
+        points_selector=models.PointIdsList(points=ids),
     )
+    async with SessionLocal() as db:
+        await db.execute(
+            delete(DocumentChunk).where(
+                DocumentChunk.document_hash == pdf_hash,
+                DocumentChunk.point_id.in_([uuid.UUID(i) for i in ids]),
+            )
+        )
+        await db.commit()
+
+
+async def indexed_points(pdf_hash: str) -> set[str]:
+    async with SessionLocal() as db:
+        result = await db.execute(
+            select(DocumentChunk.point_id).where(DocumentChunk.document_hash == pdf_hash)
+        )
+        return {str(row[0]) for row in result}
+
+
+async def with_retry(fn, *args, **kwargs):
+    attempts = settings.EMBED_MAX_RETRIES + 1
+    for attempt in range(attempts):
+        try:
+            return await fn(*args, **kwargs)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if attempt == attempts - 1:
+                raise
+            delay = settings.EMBED_RETRY_BACKOFF_SECONDS * (2 ** attempt)
+            delay += random.uniform(0, delay)
+            logger.warning("Retrying after error", extra={"call": fn.__name__, "retry_in": round(delay, 2), "error": str(e)})
+            await asyncio.sleep(delay)
+
+
+class BulkWriter:
+    """
+    Embeds and upserts chunks batch by batch. Up to EMBED_CONCURRENCY batches
+    are in flight at once, so Qdrant upserts of one batch overlap with the
+    embedding of the next ones.
+
+    Every chunk is keyed by its content hash and recorded in document_chunks.
+    Chunks already stored for this document are skipped, chunks found in
+    `base_hash` (a previous revision) reuse its vectors, and only the rest
+    are embedded. Points of this document that were not seen again are
+    deleted on finish.
+    """
+
+    def __init__(self, pdf_hash: str, existing: set[str], base_hash: str | None = None, on_progress=None):
+        self.pdf_hash = pdf_hash
+        self.existing = existing
+        self.base_hash = base_hash
+        self.on_progress = on_progress
+        self.tasks: set[asyncio.Task] = set()
+        self.occurrences: dict[str, int] = {}
+        self.seen: set[str] = set()
+        self.attempted: set[str] = set()
+        self.processed = 0
+        self.embedded = 0
+
+    async def add(self, chunks: list):
+        keyed = []
+        for chunk in chunks:
+            hash_ = chunk_hash(chunk.page_content)
+            occurrence = self.occurrences.get(hash_, 0)
+            self.occurrences[hash_] = occurrence + 1
+            id_ = point_id(self.pdf_hash, hash_, occurrence)
+            self.seen.add(id_)
+            if id_ not in self.existing:
+                keyed.append((id_, hash_, chunk))
+
+        while len(self.tasks) >= settings.EMBED_CONCURRENCY:
+            await self._wait(asyncio.FIRST_COMPLETED)
+        self.tasks.add(asyncio.create_task(self._write(keyed, len(chunks))))
+
+    async def finish(self) -> int:
+        if self.tasks:
+            await self._wait(asyncio.ALL_COMPLETED)
+        await delete_points(self.pdf_hash, list(self.existing - self.seen))
+        # Points written before chunk hashing existed can't be matched, drop them
+        await (await get_qdrant()).delete(
+            collection_name=await collection_name(),
+            points_selector=models.FilterSelector(filter=models.Filter(
+                must=[
+                    *pdf_filter(self.pdf_hash).must,
+                    models.IsEmptyCondition(is_empty=models.PayloadField(key="metadata.chunk_hash")),
+                ]
+            )),
+        )
+        return len(self.seen)
+
+    async def abort(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks.clear()
+        # Roll back to the state before this run so no half-written revision is searchable
+        await delete_points(self.pdf_hash, list(self.attempted - self.existing))
+
+    async def _wait(self, return_when):
+        done, pending = await asyncio.wait(self.tasks, return_when=return_when)
+        self.tasks = set(pending)
+        for task in done:
+            task.result()
+
+    async def _reusable_vectors(self, hashes: list[str]) -> dict[str, list[float]]:
+        if not self.base_hash or not hashes:
+            return {}
+        async with SessionLocal() as db:
+            result = await db.execute(
+                select(DocumentChunk.point_id, DocumentChunk.chunk_hash).where(
+                    DocumentChunk.document_hash == self.base_hash,
+                    DocumentChunk.chunk_hash.in_(hashes),
+                )
+            )
+            by_id = {str(row[0]): row[1] for row in result}
+        if not by_id:
+            return {}
+        points = await with_retry(
+            (await get_qdrant()).retrieve,
+            collection_name=await collection_name(),
+            ids=list(by_id),
+            with_vectors=True,
+            with_payload=False,
+        )
+        return {by_id[str(point.id)]: point.vector for point in points}
+
+    async def _write(self, keyed: list, batch_size: int):
+        if keyed:
+            reused = await self._reusable_vectors(list({hash_ for _, hash_, _ in keyed}))
+            missing = [(id_, hash_, chunk) for id_, hash_, chunk in keyed if hash_ not in reused]
+            vectors = dict(reused)
+            if missing:
+                with ingest_stage_seconds.time("embed"):
+                    embedded = await with_retry(
+                        (await get_embedder()).aembed_documents, [chunk.page_content for _, _, chunk in missing]
+                    )
+                vectors.update((hash_, vector) for (_, hash_, _), vector in zip(missing, embedded))
+                self.embedded += len(missing)
+
+            points = [
+                models.PointStruct(
+                    id=id_,
+                    vector=vectors[hash_],
+                    payload={
+                        "page_content": chunk.page_content,
+                        "metadata": {
+                            **chunk.metadata,
+                            "pdf_id": self.pdf_hash,
+                            "chunk_hash": hash_,
+                            "splitter": splitter_version(),
+                        },
+                    },
+                )
+                for id_, hash_, chunk in keyed
+            ]
+            self.attempted.update(id_ for id_, _, _ in keyed)
+            with ingest_stage_seconds.time("upsert"):
+                await with_retry(
+                    (await get_qdrant()).upsert,
+                    collection_name=await collection_name(),
+                    points=points,
+                    wait=True,
+                )
+            async with SessionLocal() as db:
+                await db.execute(
+                    insert(DocumentChunk)
+                    .values([
+                        {"point_id": uuid.UUID(id_), "document_hash": self.pdf_hash, "chunk_hash": hash_}
+                        for id_, hash_, _ in keyed
+                    ])
+                    .on_conflict_do_nothing(index_elements=[DocumentChunk.point_id])
+                )
+                await db.commit()
+
+        self.processed += batch_size
+        if self.on_progress:
+            await self.on_progress(self.processed)
+
+
+async def upsert_pdf_embeddings(batches, pdf_hash: str, base_hash: str | None = None, on_progress=None) -> int:
+    """Write an async iterable of chunk batches; batches are pulled only as fast as they can be embedded."""
+    writer = BulkWriter(pdf_hash, await indexed_points(pdf_hash), base_hash, on_progress)
+    try:
+        async for batch in batches:
+            await writer.add(batch)
+        total = await writer.finish()
+    except BaseException:
+        await writer.abort()
+        raise
 
-    print(f"Embeddings saved to Qdrant. for pdf_id:{pdf_hash}")
+    logger.info("Embeddings saved to Qdrant", extra={"pdf_hash": pdf_hash, "embedded": writer.embedded, "chunks": total})
+    return total
@@ -1,15 +1,26 @@
+from dataclasses import dataclass
 from typing import Optional, Dict, Any
+from fastapi import Response
+from pydantic import BaseModel
+import orjson
 
+
+def _default(obj):
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+@dataclass(slots=True)
 class ApiResponse:
-    def __init__(self, 
-                 status_code: int, 
-                 message: str, 
-                 data: Optional[Dict[str, Any]] = None, 
-                 errors: Optional[Dict[str, Any]] = None):
-        self.status_code = status_code
-        self.message = message
-        self.data = data or {}
-        self.errors = errors or {}
+    status_code: int
+    message: str
+    data: Optional[Dict[str, Any]] = None
+    errors: Optional[Dict[str, Any]] = None
+
+    def __post_init__(self):
+        self.data = self.data or {}
+        self.errors = self.errors or {}
 
     def to_dict(self):
         return {
@@ -18,3 +29,11 @@ class ApiResponse:
             "data": self.data,
             "errors": self.errors
         }
+
+    def to_response(self) -> Response:
+        # orjson serializes the dataclass, UUIDs and datetimes natively, so
+        # there's no intermediate dict and no jsonable_encoder walk
+        return Response(
+            content=orjson.dumps(self, default=_default),
+            media_type="application/json",
+        )
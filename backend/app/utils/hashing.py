@@ -2,3 +2,17 @@ import hashlib
 
 def sha256_hash(text: str) -> str:
     return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class Latin1Sha256:
+    """Incremental equivalent of sha256_hash(content.decode("latin1")) for streamed uploads."""
+
+    def __init__(self):
+        self._hash = hashlib.sha256()
+
+    def update(self, chunk: bytes):
+        # latin1 maps byte to char one to one, so chunk boundaries don't matter
+        self._hash.update(chunk.decode("latin1").encode("utf-8"))
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
@@ -0,0 +1,49 @@
+from app.services.answer_cache import AnswerCache
+
+
+def cache(**overrides) -> AnswerCache:
+    options = {"max_documents": 10, "per_document": 10, "ttl": 60, "threshold": 0.95}
+    options.update(overrides)
+    return AnswerCache(**options)
+
+
+def test_similar_question_is_served_the_cached_answer():
+    answers = cache()
+    answers.put("doc", "What is the notice period?", [1.0, 0.0, 0.0], "30 days")
+    assert answers.get("doc", [0.99, 0.05, 0.0]) == "30 days"
+    assert answers.stats()["hits"] == 1
+
+
+def test_dissimilar_question_and_other_documents_miss():
+    answers = cache()
+    answers.put("doc", "What is the notice period?", [1.0, 0.0, 0.0], "30 days")
+    assert answers.get("doc", [0.0, 1.0, 0.0]) is None
+    assert answers.get("other", [1.0, 0.0, 0.0]) is None
+    assert answers.stats()["misses"] == 2
+
+
+def test_best_match_wins():
+    answers = cache(threshold=0.5)
+    answers.put("doc", "first", [1.0, 0.0], "one")
+    answers.put("doc", "second", [0.0, 1.0], "two")
+    assert answers.get("doc", [0.2, 0.9]) == "two"
+
+
+def test_least_recently_used_answer_is_evicted_per_document():
+    answers = cache(per_document=2)
+    answers.put("doc", "first", [1.0, 0.0, 0.0], "one")
+    answers.put("doc", "second", [0.0, 1.0, 0.0], "two")
+    # A hit makes "first" the most recently used, so "second" goes
+    assert answers.get("doc", [1.0, 0.0, 0.0]) == "one"
+    answers.put("doc", "third", [0.0, 0.0, 1.0], "three")
+    assert answers.get("doc", [0.0, 1.0, 0.0]) is None
+    assert answers.get("doc", [1.0, 0.0, 0.0]) == "one"
+    assert answers.get("doc", [0.0, 0.0, 1.0]) == "three"
+
+
+def test_same_question_is_stored_once():
+    answers = cache()
+    answers.put("doc", "What is the notice period?", [1.0, 0.0], "30 days")
+    answers.put("doc", "what is the  NOTICE period?", [1.0, 0.0], "one month")
+    assert answers.stats()["answers"] == 1
+    assert answers.get("doc", [1.0, 0.0]) == "one month"
@@ -0,0 +1,93 @@
+import asyncio
+
+from fastapi import WebSocketDisconnect, status
+
+from app.core.settings import settings
+from app.services.connection_manager import PING_FRAME, PONG_FRAME, ConnectionManager
+
+
+class FakeWebSocket:
+    """Client that answers every ping, and optionally nothing else."""
+
+    def __init__(self, answer_pings: bool = True):
+        self.answer_pings = answer_pings
+        self.incoming: asyncio.Queue = asyncio.Queue()
+        self.sent: list[str] = []
+        self.close_code: int | None = None
+
+    async def receive(self):
+        return await self.incoming.get()
+
+    async def send_text(self, text: str):
+        self.sent.append(text)
+        if text == PING_FRAME and self.answer_pings:
+            self.incoming.put_nowait({"type": "websocket.receive", "text": PONG_FRAME})
+
+    async def close(self, code: int):
+        self.close_code = code
+
+
+async def read_until_closed(connection):
+    try:
+        while True:
+            await connection.receive()
+    except WebSocketDisconnect:
+        pass
+
+
+def speed_up(monkeypatch):
+    monkeypatch.setattr(settings, "WS_HEARTBEAT_SECONDS", 0.05)
+    monkeypatch.setattr(settings, "WS_IDLE_TIMEOUT_SECONDS", 0.3)
+
+
+def test_idle_timeout_fires_with_heartbeat_on(monkeypatch):
+    speed_up(monkeypatch)
+
+    async def scenario():
+        manager = ConnectionManager(max_connections=10, max_per_user=10)
+        websocket = FakeWebSocket()
+        connection = manager.admit(websocket, "user", heartbeat=True)
+        await asyncio.wait_for(read_until_closed(connection), 2)
+        await manager.release(connection)
+        return manager, websocket
+
+    manager, websocket = asyncio.run(scenario())
+    assert websocket.sent.count(PING_FRAME) > 1
+    assert websocket.close_code == status.WS_1001_GOING_AWAY
+    assert manager.idle_closed == 1
+    assert manager.unresponsive_closed == 0
+
+
+def test_questions_keep_the_connection_open(monkeypatch):
+    speed_up(monkeypatch)
+
+    async def scenario():
+        manager = ConnectionManager(max_connections=10, max_per_user=10)
+        websocket = FakeWebSocket()
+        connection = manager.admit(websocket, "user", heartbeat=True)
+        for _ in range(5):
+            websocket.incoming.put_nowait({"type": "websocket.receive", "text": "question"})
+            assert await connection.receive() == "question"
+            await asyncio.sleep(0.1)
+        still_open = connection.close_code is None
+        await manager.release(connection)
+        return still_open
+
+    assert asyncio.run(scenario())
+
+
+def test_unanswered_pings_close_the_connection(monkeypatch):
+    speed_up(monkeypatch)
+    monkeypatch.setattr(settings, "WS_IDLE_TIMEOUT_SECONDS", 60)
+
+    async def scenario():
+        manager = ConnectionManager(max_connections=10, max_per_user=10)
+        websocket = FakeWebSocket(answer_pings=False)
+        connection = manager.admit(websocket, "user", heartbeat=True)
+        await asyncio.wait_for(read_until_closed(connection), 2)
+        await manager.release(connection)
+        return manager
+
+    manager = asyncio.run(scenario())
+    assert manager.unresponsive_closed == 1
+    assert manager.idle_closed == 0
@@ -0,0 +1,31 @@
+from app.services.conversation_memory import ConversationMemory, estimate_tokens
+
+
+def questions(messages: list[dict]) -> list[str]:
+    return [m["content"] for m in messages if m["role"] == "user"]
+
+
+def test_prompt_carries_past_turns_and_the_context():
+    memory = ConversationMemory("system", token_budget=1000)
+    memory.add_turn("q1", "a1")
+    messages = memory.prompt("q2", "some context")
+    assert messages[0] == {"role": "system", "content": "system"}
+    assert questions(messages) == ["q1", "q2\n\nContext:\nsome context"]
+
+
+def test_oldest_turns_are_dropped_to_fit_the_budget():
+    memory = ConversationMemory("system", token_budget=100)
+    for i in range(5):
+        memory.add_turn(f"question {i}", "x" * 80)  # ~24 tokens per turn
+    messages = memory.prompt("next", "y" * 100)
+    kept = questions(messages)[:-1]
+    assert kept == ["question 3", "question 4"]
+    assert sum(estimate_tokens(m["content"]) for m in messages) <= 100
+
+
+def test_turn_cap_keeps_the_token_count_in_step():
+    memory = ConversationMemory("system", token_budget=10_000, max_turns=2)
+    for i in range(4):
+        memory.add_turn(f"q{i}", f"a{i}")
+    assert [q for q, _, _ in memory.turns] == ["q2", "q3"]
+    assert memory.tokens == sum(tokens for _, _, tokens in memory.turns)
@@ -0,0 +1,74 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.services import documents
+from conftest import FakeResult
+
+
+def record_releases(monkeypatch) -> list:
+    released = []
+
+    async def release_document(pdf_hash):
+        released.append(pdf_hash)
+
+    monkeypatch.setattr(documents, "release_document", release_document)
+    return released
+
+
+def test_switch_revision_releases_the_old_document(monkeypatch, fake_db):
+    fake_db(documents, FakeResult(rowcount=1))
+    released = record_releases(monkeypatch)
+    asyncio.run(documents.switch_revision("pdf", "old", "new"))
+    assert released == ["old"]
+
+
+def test_switch_revision_after_the_pdf_moved_on_releases_the_new_document(monkeypatch, fake_db):
+    # Deleted meanwhile, or another revision switched it first: old was released already
+    fake_db(documents, FakeResult(rowcount=0))
+    released = record_releases(monkeypatch)
+    asyncio.run(documents.switch_revision("pdf", "old", "new"))
+    assert released == ["new"]
+
+
+def document(ref_count: int, status: str = "ready"):
+    return SimpleNamespace(ref_count=ref_count, status=status)
+
+
+def record_purges(monkeypatch) -> list:
+    purged = []
+
+    async def delete_pdf_embeddings(pdf_hash):
+        purged.append(pdf_hash)
+
+    monkeypatch.setattr(documents, "delete_pdf_embeddings", delete_pdf_embeddings)
+    return purged
+
+
+def test_release_keeps_a_document_others_still_hold(monkeypatch, fake_db):
+    shared = document(ref_count=2)
+    fake_db(documents, FakeResult(row=(shared,)))
+    purged = record_purges(monkeypatch)
+    asyncio.run(documents.release_document("doc"))
+    assert shared.ref_count == 1
+    assert purged == []
+
+
+def test_release_of_the_last_reference_purges_the_vectors(monkeypatch, fake_db):
+    fake_db(documents, FakeResult(row=(document(ref_count=1),)))
+    purged = record_purges(monkeypatch)
+    asyncio.run(documents.release_document("doc"))
+    assert purged == ["doc"]
+
+
+def test_release_leaves_a_document_being_ingested_to_the_pipeline(monkeypatch, fake_db):
+    fake_db(documents, FakeResult(row=(document(ref_count=1, status="pending"),)))
+    purged = record_purges(monkeypatch)
+    asyncio.run(documents.release_document("doc"))
+    assert purged == []
+
+
+def test_finishing_an_orphaned_ingestion_purges_its_vectors(monkeypatch, fake_db):
+    fake_db(documents, FakeResult(row=(document(ref_count=0, status="pending"),)))
+    purged = record_purges(monkeypatch)
+    asyncio.run(documents.finish_document("doc", "ready", 10, "splitter"))
+    assert purged == ["doc"]
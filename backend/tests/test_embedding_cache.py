@@ -0,0 +1,40 @@
+import asyncio
+
+from langchain_core.embeddings import Embeddings
+
+from app.core.metrics import chat_stage_seconds
+from app.services.embedding_cache import CachedEmbeddings
+
+
+class FakeEmbeddings(Embeddings):
+    def __init__(self):
+        self.calls = 0
+
+    def embed_query(self, text: str) -> list[float]:
+        self.calls += 1
+        return [float(len(text)), 1.0]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.embed_query(text) for text in texts]
+
+
+def embed_samples() -> int:
+    entry = chat_stage_seconds.values.get(("embed",))
+    return entry[2] if entry else 0
+
+
+def test_embed_stage_is_timed_once_per_model_call():
+    embedder = FakeEmbeddings()
+    cached = CachedEmbeddings(embedder, "fake", maxsize=10, ttl=60)
+    before = embed_samples()
+
+    async def scenario():
+        # The answer cache lookup, then retrieval, embed the same question
+        first = await cached.aembed_query("What is the notice period?")
+        second = await cached.aembed_query("what is the  notice period?")
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == second
+    assert embedder.calls == 1
+    assert embed_samples() - before == 1
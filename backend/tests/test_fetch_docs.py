@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.services.fetch_docs import rerank, rrf, select_chunks
+
+
+def point(id_: str, vector: list[float], text: str):
+    return SimpleNamespace(id=id_, vector=vector, payload={"page_content": text})
+
+
+def test_rrf_rewards_ids_ranked_by_both_retrievers():
+    scores = rrf(["a", "b", "c"], ["c", "d"])
+    assert max(scores, key=scores.get) == "c"
+    assert scores["a"] > scores["b"] == scores["d"]
+
+
+def test_rerank_boosts_chunks_containing_the_question_terms():
+    points = [
+        point("plain", [1.0, 0.0], "unrelated wording here"),
+        point("exact", [0.98, 0.2], "clause 4.2.1 sets the notice period"),
+    ]
+    ranked, vectors, relevance = rerank("notice period in clause 4.2.1", [1.0, 0.0], points)
+    assert [p.id for p in ranked] == ["exact", "plain"]
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+    assert relevance[0] > relevance[1]
+
+
+def select(points, k=4, budget=2000):
+    vectors = np.asarray([p.vector for p in points], dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    relevance = np.linspace(1.0, 0.5, len(points), dtype=np.float32)
+    return [p.id for p in select_chunks(points, vectors, relevance, k, budget)]
+
+
+def test_select_chunks_skips_near_duplicates():
+    points = [
+        point("first", [1.0, 0.0, 0.0], "a"),
+        point("copy", [1.0, 0.001, 0.0], "a"),
+        point("other", [0.0, 1.0, 0.0], "b"),
+    ]
+    assert select(points) == ["first", "other"]
+
+
+def test_select_chunks_stops_at_k():
+    points = [point(str(i), [0.0] * i + [1.0] + [0.0] * (5 - i), "text") for i in range(6)]
+    assert len(select(points, k=3)) == 3
+
+
+def test_select_chunks_stops_at_the_token_budget():
+    long_text = "x" * 400  # ~101 tokens
+    points = [point(str(i), [0.0] * i + [1.0] + [0.0] * (3 - i), long_text) for i in range(4)]
+    assert select(points, budget=250) == ["0", "1"]
+
+
+def test_select_chunks_keeps_the_best_chunk_even_over_budget():
+    points = [point("huge", [1.0, 0.0], "x" * 4000), point("small", [0.0, 1.0], "y")]
+    assert select(points, budget=10) == ["huge"]
@@ -0,0 +1,79 @@
+import asyncio
+import threading
+import time
+import uuid
+
+from app.services import ingestion
+from app.services.ingestion import IngestionPipeline, IngestionTask
+
+
+class Chunk:
+    def __init__(self, page: int):
+        self.page_content = f"page {page}"
+        self.metadata = {"page": page}
+
+
+def test_stop_cancels_a_job_while_a_batch_is_parsing(monkeypatch):
+    parsing = threading.Event()
+    failures = []
+
+    def slow_chunks(path, pages):
+        for page in range(pages):
+            parsing.set()
+            time.sleep(0.05)
+            yield Chunk(page)
+
+    async def upsert(batches, pdf_hash, base_hash=None, on_progress=None):
+        count = 0
+        async for batch in batches:
+            count += len(batch)
+        return count
+
+    async def record_job(job_id, **values):
+        if values.get("status") == "failed":
+            failures.append(values["error"])
+
+    async def noop(*args, **kwargs):
+        pass
+
+    monkeypatch.setattr(ingestion, "count_pages", lambda path: 10)
+    monkeypatch.setattr(ingestion, "iter_pdf_chunks", slow_chunks)
+    monkeypatch.setattr(ingestion, "upsert_pdf_embeddings", upsert)
+    monkeypatch.setattr(ingestion, "update_job", record_job)
+    monkeypatch.setattr(ingestion, "finish_document", noop)
+    monkeypatch.setattr(ingestion, "release_document", noop)
+    monkeypatch.setattr(ingestion, "remove_file", lambda path: None)
+    monkeypatch.setattr(ingestion, "shutdown_process_pool", lambda: None)
+
+    async def scenario():
+        pipeline = IngestionPipeline(workers=1, queue_size=1)
+        await pipeline.start()
+        pipeline.submit(IngestionTask(job_id=uuid.uuid4(), pdf_hash="doc", path="doc.pdf"))
+        while not parsing.is_set():
+            await asyncio.sleep(0.01)
+        await asyncio.wait_for(pipeline.stop(), 2)
+        return pipeline
+
+    pipeline = asyncio.run(scenario())
+    assert pipeline.tasks == []
+    assert failures and all(error == "Interrupted by server shutdown" for error in failures)
+
+
+def test_heartbeat_keeps_in_flight_jobs_fresh(monkeypatch, fake_db):
+    database = fake_db(ingestion)
+    monkeypatch.setattr(ingestion.settings, "INGEST_HEARTBEAT_SECONDS", 0.02)
+
+    async def scenario():
+        pipeline = IngestionPipeline(workers=1, queue_size=1)
+        await pipeline.start()
+        # Tracked as in flight without a worker picking it up
+        job_id = uuid.uuid4()
+        pipeline.in_flight[job_id] = IngestionTask(job_id=job_id, pdf_hash="doc", path="doc.pdf")
+        await asyncio.sleep(0.1)
+        pipeline.in_flight.clear()
+        await pipeline.stop()
+
+    monkeypatch.setattr(ingestion, "shutdown_process_pool", lambda: None)
+    asyncio.run(scenario())
+    touched = [str(s) for s in database.statements]
+    assert touched and all(s.startswith("UPDATE ingestion_jobs SET updated_at") for s in touched)
@@ -0,0 +1,88 @@
+import asyncio
+import uuid
+
+import pytest
+
+from app.services import message_sink as sink_module
+from sqlalchemy.exc import IntegrityError
+
+from app.services.message_sink import MessageSink
+
+
+def rows(count: int, session_id=None) -> list[dict]:
+    session_id = session_id or uuid.uuid4()
+    return [{"id": uuid.uuid4(), "session_id": session_id, "content": f"message {i}"} for i in range(count)]
+
+
+def test_stop_flushes_rows_the_flusher_is_holding(fake_db):
+    committed = fake_db(sink_module).committed
+
+    async def scenario():
+        # A long interval keeps the rows in the flusher's batch when stop() comes
+        sink = MessageSink(batch_size=100, flush_interval_ms=60_000, max_queue=10, durability="async")
+        await sink.start()
+        await sink.write(rows(2))
+        await asyncio.sleep(0.05)
+        await asyncio.wait_for(sink.stop(), 1)
+
+    asyncio.run(scenario())
+    assert len(committed) == 2
+
+
+def test_stop_without_flusher_drains_queue(fake_db):
+    committed = fake_db(sink_module).committed
+
+    async def scenario():
+        sink = MessageSink(batch_size=2, flush_interval_ms=10, max_queue=10, durability="async")
+        for _ in range(3):
+            await sink.write(rows(1))
+        await sink.stop()
+
+    asyncio.run(scenario())
+    assert len(committed) == 3
+
+
+def test_sync_writers_are_released_on_stop(fake_db):
+    committed = fake_db(sink_module).committed
+
+    async def scenario():
+        sink = MessageSink(batch_size=100, flush_interval_ms=60_000, max_queue=10, durability="sync")
+        await sink.start()
+        writer = asyncio.create_task(sink.write(rows(1)))
+        await asyncio.sleep(0.05)
+        await sink.stop()
+        await asyncio.wait_for(writer, 1)
+
+    asyncio.run(scenario())
+    assert len(committed) == 1
+
+
+def test_a_deleted_session_does_not_drop_other_sessions_rows(fake_db):
+    database = fake_db(sink_module)
+    deleted = uuid.uuid4()
+    attempts = []
+
+    def reject(batch):
+        attempts.append(len(batch))
+        if any(row["session_id"] == deleted for row in batch):
+            return IntegrityError("INSERT INTO chat_messages", {}, Exception("foreign key violation"))
+
+    database.reject = reject
+
+    async def scenario():
+        sink = MessageSink(batch_size=100, flush_interval_ms=60_000, max_queue=10, durability="sync")
+        await sink.start()
+        kept = [asyncio.create_task(sink.write(rows(2))) for _ in range(2)]
+        lost = asyncio.create_task(sink.write(rows(2, session_id=deleted)))
+        await asyncio.sleep(0.05)
+        await sink.stop()
+        await asyncio.gather(*kept)
+        with pytest.raises(IntegrityError):
+            await lost
+        return sink
+
+    sink = asyncio.run(scenario())
+    assert len(database.committed) == 4
+    assert sink.stats()["rows_failed"] == 2
+    # No blind retries: the batch once, then each session once
+    assert attempts == [6, 2, 2, 2]
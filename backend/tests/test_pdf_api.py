@@ -0,0 +1,23 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy.sql.dml import Update
+
+from app.api.v1.pdf import active_job
+from app.core.settings import settings
+from conftest import FakeDatabase
+
+
+def test_active_job_fails_jobs_whose_worker_went_quiet():
+    database = FakeDatabase()
+    asyncio.run(active_job(database(), "doc", pdf_id=None))
+
+    expire, lookup = database.statements
+    assert isinstance(expire, Update)
+    params = expire.compile().params
+    assert params["status"] == "failed"
+    cutoff = next(value for key, value in params.items() if key.startswith("updated_at_"))
+    expected = datetime.now() - timedelta(seconds=settings.INGEST_JOB_STALE_SECONDS)
+    assert abs(cutoff - expected) < timedelta(seconds=5)
+    # The lookup runs after, so a stale job is never returned as active
+    assert "ingestion_jobs.status IN" in str(lookup)
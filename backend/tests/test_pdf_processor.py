@@ -0,0 +1,63 @@
+import asyncio
+import hashlib
+import os
+
+from app.core.settings import settings
+from app.services import documents
+from app.services.pdf_processor import spool_upload
+from app.utils.hashing import sha256_hash
+from conftest import FakeDatabase, FakeResult
+
+CONTENT = b"%PDF-1.4 caf\xe9 \x80\xff" * 1000
+
+
+class FakeUpload:
+    def __init__(self, data: bytes, chunk: int = 777):
+        self.data = data
+        self.chunk = chunk
+        self.offset = 0
+
+    async def read(self, size: int) -> bytes:
+        size = min(size, self.chunk)
+        chunk = self.data[self.offset:self.offset + size]
+        self.offset += len(chunk)
+        return chunk
+
+
+def spool(monkeypatch, tmp_path, legacy: bool):
+    monkeypatch.setattr(settings, "UPLOAD_TMP_DIR", str(tmp_path))
+    path, content_hash, legacy_hash = asyncio.run(spool_upload(FakeUpload(CONTENT), legacy_hash=legacy))
+    with open(path, "rb") as f:
+        assert f.read() == CONTENT
+    os.unlink(path)
+    return content_hash, legacy_hash
+
+
+def test_spool_upload_computes_the_legacy_hash_in_the_same_pass(monkeypatch, tmp_path):
+    content_hash, legacy_hash = spool(monkeypatch, tmp_path, legacy=True)
+    assert content_hash == hashlib.sha256(CONTENT).hexdigest()
+    assert legacy_hash == sha256_hash(CONTENT.decode("latin1"))
+
+
+def test_spool_upload_skips_the_legacy_hash_unless_asked(monkeypatch, tmp_path):
+    content_hash, legacy_hash = spool(monkeypatch, tmp_path, legacy=False)
+    assert content_hash == hashlib.sha256(CONTENT).hexdigest()
+    assert legacy_hash is None
+
+
+def test_legacy_hash_stops_once_no_legacy_documents_are_left(monkeypatch):
+    monkeypatch.setattr(settings, "LEGACY_HASH_COMPAT", True)
+    monkeypatch.setattr(documents, "_legacy_documents_left", True)
+    assert documents.legacy_hash_needed()
+
+    # No document by content hash, and no row without one either
+    db = FakeDatabase(FakeResult(row=None))()
+    resolved = asyncio.run(documents.resolve_document_hash(db, "sha", "legacy"))
+    assert resolved == "sha"
+    assert not documents.legacy_hash_needed()
+
+
+def test_legacy_hash_is_off_without_compat(monkeypatch):
+    monkeypatch.setattr(settings, "LEGACY_HASH_COMPAT", False)
+    monkeypatch.setattr(documents, "_legacy_documents_left", True)
+    assert not documents.legacy_hash_needed()
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from app.services.rate_limiter import InMemoryBackend, RateLimiter, RedisBackend
+
+
+def check_many(limiter: RateLimiter, user_id: str, count: int) -> list[bool]:
+    async def scenario():
+        return [(await limiter.check(user_id)).allowed for _ in range(count)]
+
+    return asyncio.run(scenario())
+
+
+def test_global_rejection_does_not_spend_the_user_quota():
+    backend = InMemoryBackend(window=60)
+    limiter = RateLimiter(backend, user_limit=5, global_limit=2, window=60)
+
+    assert check_many(limiter, "other", 2) == [True, True]
+    assert check_many(limiter, "user", 3) == [False, False, False]
+
+    tokens, _ = backend.buckets["user:user"]
+    assert tokens >= 5 - 1e-3
+
+
+def test_user_limit_still_applies():
+    limiter = RateLimiter(InMemoryBackend(window=60), user_limit=2, global_limit=100, window=60)
+    assert check_many(limiter, "user", 3) == [True, True, False]
+
+
+def redis_server():
+    # A Redis protocol stand-in, Lua scripting included
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    return fakeredis.FakeServer()
+
+
+def redis_backend(server) -> RedisBackend:
+    import fakeredis
+
+    return RedisBackend(fakeredis.FakeAsyncRedis(server=server, decode_responses=True))
+
+
+def test_redis_backend_is_shared_by_every_worker():
+    server = redis_server()
+    workers = [redis_backend(server), redis_backend(server)]
+
+    async def scenario():
+        return [(await workers[i % 2].hit("user:a", 3, 60)).allowed for i in range(4)]
+
+    assert asyncio.run(scenario()) == [True, True, True, False]
+
+
+def test_redis_backend_refund_gives_the_request_back():
+    backend = redis_backend(redis_server())
+
+    async def scenario():
+        first = await backend.hit("user:a", 2, 60)
+        await backend.refund("user:a", 2, 60)
+        second = await backend.hit("user:a", 2, 60)
+        third = await backend.hit("user:a", 2, 60)
+        fourth = await backend.hit("user:a", 2, 60)
+        return first, second, third, fourth
+
+    first, second, third, fourth = asyncio.run(scenario())
+    assert first.allowed and second.allowed and third.allowed
+    assert not fourth.allowed
+    assert fourth.remaining == 0
+
+
+def test_global_rejection_does_not_spend_the_user_quota_in_redis():
+    limiter = RateLimiter(redis_backend(redis_server()), user_limit=2, global_limit=1, window=60)
+    assert check_many(limiter, "other", 1) == [True]
+    assert check_many(limiter, "user", 3) == [False, False, False]
+    limiter.global_limit = 10
+    assert check_many(limiter, "user", 3) == [True, True, False]
@@ -0,0 +1,25 @@
+import asyncio
+
+from app.core import security
+
+
+def test_unknown_user_login_uses_the_hash_prepared_at_startup(monkeypatch):
+    monkeypatch.setattr(security, "_dummy_hash", None)
+    hashed = []
+    real_hash = security.get_password_hash
+
+    def counting_hash(password):
+        hashed.append(password)
+        return real_hash(password)
+
+    monkeypatch.setattr(security, "get_password_hash", counting_hash)
+
+    async def scenario():
+        await security.prepare_dummy_hash()
+        first = await security.check_password("guess", None)
+        second = await security.check_password("guess", None)
+        return first, second
+
+    assert asyncio.run(scenario()) == (False, False)
+    # Hashed once at startup, never again on the login path
+    assert hashed == ["dummy-password"]
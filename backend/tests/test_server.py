@@ -0,0 +1,22 @@
+import asyncio
+
+import uvicorn
+
+from app import server
+
+
+def test_shutdown_drains_sockets_before_uvicorn_closes_them(monkeypatch):
+    calls = []
+
+    async def drain():
+        calls.append("drain")
+
+    async def shutdown(self, sockets=None):
+        calls.append("uvicorn")
+
+    monkeypatch.setattr(server.connection_manager, "drain", drain)
+    monkeypatch.setattr(uvicorn.Server, "shutdown", shutdown)
+
+    instance = server.Server(uvicorn.Config("app.main:app"))
+    asyncio.run(instance.shutdown())
+    assert calls == ["drain", "uvicorn"]
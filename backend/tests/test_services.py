@@ -0,0 +1,40 @@
+import asyncio
+import threading
+import time
+
+from app.core.services import ServiceRegistry
+
+
+def test_aget_waits_for_a_slow_build_without_blocking_the_loop():
+    registry = ServiceRegistry()
+    builds = []
+    release = threading.Event()
+
+    def factory():
+        builds.append(1)
+        release.wait(2)
+        return object()
+
+    registry.register("model", factory)
+
+    async def scenario():
+        registry.start(["model"])
+        await asyncio.sleep(0.05)
+        waiter = asyncio.create_task(registry.aget("model"))
+        # The loop keeps running while the warm-up thread is still building
+        ticks = 0
+        started = time.monotonic()
+        while time.monotonic() - started < 0.1:
+            await asyncio.sleep(0.01)
+            ticks += 1
+        assert not waiter.done()
+        release.set()
+        instance = await asyncio.wait_for(waiter, 2)
+        await registry.task
+        return instance, ticks
+
+    instance, ticks = asyncio.run(scenario())
+    assert ticks >= 5
+    assert registry.peek("model") is instance
+    assert registry.ready
+    assert builds == [1]
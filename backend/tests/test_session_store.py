@@ -0,0 +1,48 @@
+import asyncio
+import uuid
+
+from app.services.session_store import SessionHistoryCache
+
+
+def history_with(stored: list[tuple[str, str]]) -> tuple[SessionHistoryCache, list]:
+    history = SessionHistoryCache(maxsize=10, ttl=60, max_turns=3)
+    fetches = []
+
+    async def fetch(session_id):
+        fetches.append(session_id)
+        return list(stored)
+
+    history._fetch = fetch
+    return history, fetches
+
+
+def test_new_session_is_seeded_without_a_query():
+    history, fetches = history_with([])
+    session_id = uuid.uuid4()
+    history.start(session_id)
+    history.append(session_id, "q1", "a1")
+    # A reconnect right away sees the turn even though the sink hasn't flushed it
+    assert asyncio.run(history.load(session_id)) == [("q1", "a1")]
+    assert fetches == []
+
+
+def test_reconnect_loads_from_the_database_once():
+    history, fetches = history_with([("q1", "a1"), ("q2", "a2")])
+    session_id = uuid.uuid4()
+
+    async def scenario():
+        await history.load(session_id)
+        history.append(session_id, "q3", "a3")
+        history.append(session_id, "q4", "a4")
+        return await history.load(session_id)
+
+    assert asyncio.run(scenario()) == [("q2", "a2"), ("q3", "a3"), ("q4", "a4")]
+    assert fetches == [session_id]
+
+
+def test_append_after_eviction_leaves_the_entry_to_the_next_load():
+    history, fetches = history_with([("q1", "a1")])
+    session_id = uuid.uuid4()
+    history.append(session_id, "q2", "a2")
+    assert session_id not in history.cache
+    assert fetches == []
@@ -0,0 +1,64 @@
+import asyncio
+
+from sqlalchemy.dialects import postgresql
+
+from app.services import sparse_index as sparse_module
+from app.services.sparse_index import SparseIndexStore
+from conftest import FakeResult
+
+
+def store_counting_builds() -> tuple[SparseIndexStore, list]:
+    store = SparseIndexStore(maxsize=10, ttl=60)
+    built = []
+
+    async def build(pdf_hash):
+        built.append(pdf_hash)
+
+    store.build = build
+    return store, built
+
+
+def lookup(store: SparseIndexStore, pdf_hash: str):
+    async def scenario():
+        index = await store.get(pdf_hash)
+        await asyncio.gather(*store.building.values())
+        return index
+
+    return asyncio.run(scenario())
+
+
+def test_get_builds_lazily_only_for_ready_documents(fake_db):
+    fake_db(sparse_module, FakeResult(row=("ready", None)))
+    store, built = store_counting_builds()
+    assert lookup(store, "doc") is None
+    assert built == ["doc"]
+
+
+def test_get_does_not_build_while_the_document_is_ingesting(fake_db):
+    fake_db(sparse_module, FakeResult(row=("pending", None)))
+    store, built = store_counting_builds()
+    assert lookup(store, "doc") is None
+    assert built == []
+
+
+def test_get_does_not_build_for_unknown_documents(fake_db):
+    fake_db(sparse_module, FakeResult(row=None))
+    store, built = store_counting_builds()
+    assert lookup(store, "missing") is None
+    assert built == []
+
+
+def test_build_never_replaces_a_newer_index(monkeypatch, fake_db):
+    statements = fake_db(sparse_module, FakeResult(rowcount=0)).statements
+
+    async def scroll_chunks(pdf_hash):
+        return [("1", "termination notice period")]
+
+    monkeypatch.setattr(sparse_module, "scroll_chunks", scroll_chunks)
+    store = SparseIndexStore(maxsize=10, ttl=60)
+    asyncio.run(store.build("doc"))
+
+    sql = str(statements[0].compile(dialect=postgresql.dialect()))
+    assert "WHERE sparse_indexes.built_at < excluded.built_at" in sql
+    # The row kept is the newer one, so this stale build isn't served either
+    assert "doc" not in store.cache
@@ -0,0 +1,95 @@
+import asyncio
+
+from qdrant_client import AsyncQdrantClient
+
+from app.core.settings import settings
+from app.services import vector_store
+from conftest import FakeResult
+
+
+def test_qdrant_client_builds_with_pool_limits():
+    client = vector_store._create_qdrant()
+    assert isinstance(client, AsyncQdrantClient)
+    pool = client._client.http.client._async_client._transport._pool
+    assert pool._max_connections == settings.QDRANT_POOL_SIZE
+
+
+def test_point_ids_are_stable_per_chunk():
+    first = vector_store.point_id("doc", "chunk", 0)
+    assert first == vector_store.point_id("doc", "chunk", 0)
+    assert first != vector_store.point_id("doc", "chunk", 1)
+
+
+class FakeConnection:
+    def __init__(self, marked: bool):
+        self.marked = marked
+        self.statements = []
+
+    async def execute(self, statement, params=None):
+        self.statements.append(str(statement))
+        return FakeResult((1,) if self.marked and "SELECT 1" in str(statement) else None)
+
+
+class FakeEngine:
+    def __init__(self, connection: FakeConnection):
+        self.connection = connection
+
+    def begin(self):
+        connection = self.connection
+
+        class Transaction:
+            async def __aenter__(self):
+                return connection
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return Transaction()
+
+
+class FakeQdrant:
+    def __init__(self, exists: bool):
+        self.exists = exists
+        self.created = []
+        self.indexed = []
+
+    async def collection_exists(self, name):
+        return self.exists
+
+    async def create_collection(self, collection_name, vectors_config):
+        self.created.append(collection_name)
+
+    async def create_payload_index(self, collection_name, field_name, field_schema):
+        self.indexed.append(field_name)
+
+
+class FakeBackend:
+    name = "google"
+    dimension = 8
+
+
+def ensure(monkeypatch, marked: bool, exists: bool) -> FakeQdrant:
+    qdrant = FakeQdrant(exists)
+    monkeypatch.setattr(vector_store, "engine", FakeEngine(FakeConnection(marked)))
+    async def get_qdrant():
+        return qdrant
+
+    async def get_embedding_backend():
+        return FakeBackend()
+
+    monkeypatch.setattr(vector_store, "get_qdrant", get_qdrant)
+    monkeypatch.setattr(vector_store, "get_embedding_backend", get_embedding_backend)
+    asyncio.run(vector_store.ensure_collection())
+    return qdrant
+
+
+def test_ensure_collection_recreates_a_collection_missing_from_a_fresh_qdrant(monkeypatch):
+    qdrant = ensure(monkeypatch, marked=True, exists=False)
+    assert qdrant.created == ["chat_pdf"]
+    assert qdrant.indexed == ["metadata.pdf_id"]
+
+
+def test_ensure_collection_skips_setup_when_marked_and_present(monkeypatch):
+    qdrant = ensure(monkeypatch, marked=True, exists=True)
+    assert qdrant.created == []
+    assert qdrant.indexed == []